@@ -0,0 +1,329 @@
+"""Replay recorded chat messages through the bot handler.
+
+Services read recorded pages from bench/fixtures instead of live hosts, so
+the benchmark measures parsing, indexing and command handling only. Run from
+the app directory:
+
+    python -m bench.bot --rounds 20
+    python -m bench.bot --save baseline.json
+    python -m bench.bot --compare baseline.json
+
+Reports per rule latency percentiles, peak allocated memory and the time
+spent in regular expressions and Levenshtein functions.
+"""
+import os
+import sys
+import json
+import math
+import time
+import argparse
+import cProfile
+import pstats
+import tracemalloc
+import collections
+
+from django.conf import settings
+
+from gul.data import services
+from gul.data.services import GulService, LadokService
+from gul.data.services.base import Service
+from gul.data.bot import Command, handler, responses
+from gul.data.index import Index
+from bench.session import FixtureSession
+
+
+MESSAGES = os.path.join(os.path.dirname(__file__), 'messages.txt')
+
+IDENTITY = 'bench'
+
+# Stand-in for gul.models.Room
+Room = collections.namedtuple('Room', ['course_id', 'course_name'])
+
+CACHE_NONE = 'none'
+CACHE_SERVICES = 'services'
+CACHE_ALL = 'all'
+
+PERCENTILES = [50, 95, 99]
+
+
+def load(path, names=None):
+    """Load messages as tuples of text and room, with room course names by
+    course id."""
+
+    names = names or {}
+    messages = []
+
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+
+            if not line or line.startswith('#'):
+                continue
+
+            room = None
+            if line.startswith('@'):
+                course_id, line = line[1:].split(' ', 1)
+                room = Room(int(course_id), names.get(int(course_id), ''))
+
+            messages.append((line, room))
+
+    return messages
+
+
+def percentile(values, p):
+    """Get the nearest-rank percentile of the values."""
+
+    values = sorted(values)
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+
+def category(key):
+    """Get the measured category of a profiled function, if any."""
+
+    filename, line, name = key
+
+    if 'Levenshtein' in filename + name or 'rapidfuzz' in filename + name:
+        return 'levenshtein'
+
+    if (os.path.basename(os.path.dirname(filename)) == 're' or
+            os.path.basename(filename) in ('re.py', 'sre_compile.py',
+                                           'sre_parse.py') or
+            '_sre' in name or 're.Pattern' in name or 're.Match' in name):
+        return 'regex'
+
+    return None
+
+
+class Replay(object):
+    """Replay messages with services backed by a fixture session."""
+
+    def __init__(self, messages, session, cache=CACHE_NONE):
+        self.messages = messages
+        self.session = session
+        self.cache = cache
+
+    def reset(self):
+        """Forget cached data according to the cache mode."""
+
+        if self.cache == CACHE_ALL:
+            return
+
+        responses.clear()
+
+        if self.cache == CACHE_NONE:
+            services.invalidate(IDENTITY)
+            Index.cache.clear()
+
+    def handle(self, text, room):
+        """Handle a message and return the rule of the response."""
+
+        request = Command.Request(text.lower(), room=room, identity=IDENTITY)
+        request.use(
+            gul=GulService(session=self.session, identity=IDENTITY),
+            ladok=LadokService(session=self.session, identity=IDENTITY),
+        )
+
+        return handler.handle(request).rule or 'none'
+
+    def latency(self, rounds):
+        """Measure seconds per message, grouped by rule."""
+
+        data = collections.defaultdict(list)
+
+        for round in range(rounds):
+            for text, room in self.messages:
+                self.reset()
+
+                start = time.perf_counter()
+                rule = self.handle(text, room)
+                data[rule].append(time.perf_counter() - start)
+
+        return data
+
+    def allocations(self):
+        """Measure peak traced bytes per message, grouped by rule."""
+
+        data = collections.defaultdict(list)
+
+        tracemalloc.start()
+
+        try:
+            for text, room in self.messages:
+                self.reset()
+
+                tracemalloc.clear_traces()
+                rule = self.handle(text, room)
+                data[rule].append(tracemalloc.get_traced_memory()[1])
+        finally:
+            tracemalloc.stop()
+
+        return data
+
+    def profile(self):
+        """Measure profiled seconds per category and message, grouped by
+        rule."""
+
+        data = collections.defaultdict(lambda: collections.defaultdict(list))
+
+        for text, room in self.messages:
+            self.reset()
+
+            profile = cProfile.Profile()
+            profile.enable()
+            rule = self.handle(text, room)
+            profile.disable()
+
+            totals = collections.Counter()
+
+            for key, (cc, nc, tt, ct, callers) in \
+                    pstats.Stats(profile).stats.items():
+                totals['total'] += tt
+                totals[category(key)] += tt
+
+            for name in ('total', 'regex', 'levenshtein'):
+                data[rule][name].append(totals[name])
+
+        return data
+
+
+def run(replay, rounds):
+    """Run all measurements and return results by rule."""
+
+    start = time.perf_counter()
+    latency = replay.latency(rounds)
+    elapsed = time.perf_counter() - start
+
+    allocations = replay.allocations()
+    profile = replay.profile()
+
+    results = {}
+
+    for rule, values in latency.items():
+        results[rule] = {
+            'count': len(values),
+            'latency': {
+                str(p): percentile(values, p) for p in PERCENTILES
+            },
+            'peak': sum(allocations[rule]) / len(allocations[rule]),
+            'profile': {
+                name: sum(times) / len(times)
+                for name, times in profile[rule].items()
+            },
+        }
+
+    return {
+        'messages': sum(len(values) for values in latency.values()),
+        'seconds': elapsed,
+        'requests': replay.session.requests,
+        'rules': results,
+    }
+
+
+def report(results, out=sys.stdout):
+    """Print results as a table."""
+
+    columns = ['rule', 'count'] + [
+        'p{} ms'.format(p) for p in PERCENTILES
+    ] + ['peak KiB', 'regex %', 'lev %']
+
+    out.write(('{:<14}' + '{:>10}' * (len(columns) - 1) + '\n').format(
+        *columns))
+
+    for rule, data in sorted(results['rules'].items()):
+        total = data['profile']['total'] or 1
+
+        out.write(('{:<14}{:>10}' + '{:>10.2f}' * (len(columns) - 2) +
+                   '\n').format(
+            rule,
+            data['count'],
+            *[data['latency'][str(p)] * 1000 for p in PERCENTILES] + [
+                data['peak'] / 1024,
+                data['profile']['regex'] / total * 100,
+                data['profile']['levenshtein'] / total * 100,
+            ]
+        ))
+
+    out.write('\n{} messages in {:.2f}s ({:.1f} messages/s), '
+              '{} fixture requests\n'.format(
+                  results['messages'],
+                  results['seconds'],
+                  results['messages'] / results['seconds'],
+                  results['requests']))
+
+
+def compare(results, baseline, tolerance, out=sys.stdout):
+    """Compare p95 latency against a baseline, returning regressed rules."""
+
+    regressions = []
+
+    for rule, data in sorted(results['rules'].items()):
+        if rule not in baseline['rules']:
+            continue
+
+        current = data['latency']['95']
+        previous = baseline['rules'][rule]['latency']['95']
+
+        if current > previous * (1 + tolerance):
+            regressions.append(rule)
+            out.write('Regression in {}: p95 {:.2f} ms, was {:.2f} ms\n'
+                      .format(rule, current * 1000, previous * 1000))
+
+    return regressions
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--messages', default=MESSAGES,
+                        help='File of messages to replay.')
+    parser.add_argument('--rounds', type=int, default=10,
+                        help='Number of times to replay the messages.')
+    parser.add_argument('--cache', default=CACHE_NONE,
+                        choices=[CACHE_NONE, CACHE_SERVICES, CACHE_ALL],
+                        help='Cached data kept between messages.')
+    parser.add_argument('--latency', type=float, default=0,
+                        help='Simulated seconds per service request.')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Concurrent requests per service. Profiling '
+                             'only covers the main thread.')
+    parser.add_argument('--save', help='Write results to a JSON file.')
+    parser.add_argument('--compare',
+                        help='Compare with results from a JSON file.')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='Allowed relative p95 slowdown when comparing.')
+
+    args = parser.parse_args(argv)
+
+    # The bot does not need the database or the installed apps
+    if not settings.configured:
+        settings.configure()
+
+    Service.CONCURRENCY = args.workers
+
+    session = FixtureSession(latency=args.latency)
+
+    names = {course['id']: course['name']
+             for course in GulService(session=session).courses()}
+
+    replay = Replay(load(args.messages, names), session, cache=args.cache)
+
+    results = run(replay, args.rounds)
+
+    report(results)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+        if compare(results, baseline, args.tolerance):
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,77 @@
+import os
+import re
+import time
+from urllib.parse import urlparse, parse_qs
+
+import requests
+
+
+class FixtureSession(object):
+    """Session replaying recorded pages instead of requesting live hosts.
+
+    Pages are read from the fixture directory once and served from memory.
+    An optional latency is added to each request to simulate the network.
+    """
+
+    DIRECTORY = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+    # Fixture names by request path, formatted with the query parameters
+    ROUTES = [
+        (re.compile('/listCourses[.]do$'), ['listCourses']),
+        (re.compile('/courseParticipants[.]do$'), [
+            'courseParticipants-{listType}-{tableCurrentPageparticipantList}',
+        ]),
+        (re.compile('/contentStart[.]do$'), ['contentStart']),
+        (re.compile('/contentFrame[.]do$'), [
+            'contentFrame-{id}',
+            'contentFrame',
+        ]),
+        (re.compile('/render[.]uP$'), ['ladok']),
+    ]
+
+    class Response(object):
+
+        def __init__(self, url, text=None):
+            self.url = url
+            self.text = text or ''
+            self.status_code = (requests.codes.ok if text is not None else
+                                requests.codes.not_found)
+
+    def __init__(self, latency=0):
+        self.latency = latency
+        self.requests = 0
+        self.pages = {}
+
+        for name in os.listdir(self.DIRECTORY):
+            with open(os.path.join(self.DIRECTORY, name),
+                      encoding='utf-8') as f:
+                self.pages[os.path.splitext(name)[0]] = f.read()
+
+    def get(self, url, *args, **kwargs):
+        self.requests += 1
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        url_parts = urlparse(url)
+        query = {key: values[0]
+                 for key, values in parse_qs(url_parts.query).items()}
+
+        for pattern, names in self.ROUTES:
+            if pattern.search(url_parts.path):
+                for name in names:
+                    try:
+                        name = name.format(**query)
+                    except KeyError:
+                        continue
+
+                    if name in self.pages:
+                        return self.Response(url, self.pages[name])
+
+        return self.Response(url)
+
+    def post(self, url, *args, **kwargs):
+        return self.get(url)
+
+    def copy(self):
+        return self
@@ -0,0 +1,154 @@
+"""Compare building and running insert-if-not-exists statements.
+
+The legacy path builds the column lists, the specification and the query for
+every call and inserts all instances with one statement. The current path
+reuses compiled statements and inserts chunks of bounded size. When
+statements are run, loading through `COPY` into a staging table is measured
+too. Run from the app directory:
+
+    python -m bench.sql
+    python -m bench.sql --execute
+
+Statements are only built unless `--execute` is given, which runs them
+against the configured database in a transaction that is rolled back.
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+
+import django
+from django.db import connection, transaction
+
+from utils.sql import MCL, ModelIINE
+
+
+SIZES = [1, 10, 100, 1000, 10000]
+
+
+def legacy_queries(model, instances, connection):
+    """Get query and values as built before statements were cached."""
+
+    iine = ModelIINE(
+        model,
+        mcl_value=MCL(model, connection=connection,
+                      **model.get_iine_value_kwargs()),
+        mcl_match=MCL(model, connection=connection,
+                      **model.get_iine_match_kwargs()),
+    )
+
+    query = iine.build(size=len(instances))
+
+    values = []
+    for instance in instances:
+        values.extend(iine.mcl_value.values(instance))
+
+    return [(query, values)]
+
+
+def cached_queries(model, instances, connection):
+    """Get queries and values from cached statements."""
+    return list(model.get_iine_queries(instances, connection))
+
+
+def measure(function, repeat):
+    """Get the median seconds per call of function."""
+
+    times = []
+
+    for index in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+
+    return statistics.median(times)
+
+
+def execute(connection, queries):
+    """Run queries in a transaction that is rolled back."""
+
+    with transaction.atomic(using=connection.alias):
+        with connection.cursor() as cursor:
+            for query, values in queries:
+                cursor.execute(query, values)
+
+        transaction.set_rollback(True, using=connection.alias)
+
+
+def bulk_load(connection, model, instances):
+    """Bulk load instances in a transaction that is rolled back."""
+
+    with transaction.atomic(using=connection.alias):
+        model.bulk_load(instances, connection=connection)
+        transaction.set_rollback(True, using=connection.alias)
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sizes', default=','.join(map(str, SIZES)),
+                        help='Comma separated numbers of instances.')
+    parser.add_argument('--repeat', type=int, default=20,
+                        help='Number of measured calls per size.')
+    parser.add_argument('--execute', action='store_true',
+                        help='Run the statements against the database.')
+
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yellow.settings')
+    django.setup()
+
+    from gul.models import Room
+
+    sizes = [int(size) for size in args.sizes.split(',')]
+
+    sys.stdout.write('{:>8}{:>14}{:>14}{:>10}{:>12}{:>12}{:>12}\n'.format(
+        'rows', 'legacy ms', 'cached ms', 'speedup', 'statements',
+        'max params', 'copy ms'))
+
+    for size in sizes:
+        instances = [
+            Room(course_id=-1 - index,
+                 course_name='Benchmark course {}'.format(index))
+            for index in range(size)
+        ]
+
+        # Compiles the statements before measuring
+        queries = cached_queries(Room, instances, connection)
+
+        if args.execute:
+            legacy = legacy_queries(Room, instances, connection)
+
+            functions = [
+                lambda: execute(connection, legacy),
+                lambda: execute(connection, queries),
+            ]
+        else:
+            functions = [
+                lambda: legacy_queries(Room, instances, connection),
+                lambda: cached_queries(Room, instances, connection),
+            ]
+
+        legacy_time, cached_time = [measure(function, args.repeat)
+                                    for function in functions]
+
+        copy_time = measure(lambda: bulk_load(connection, Room, instances),
+                            args.repeat) if args.execute else None
+
+        sys.stdout.write(
+            '{:>8}{:>14.3f}{:>14.3f}{:>9.1f}x{:>12}{:>12}{:>12}\n'.format(
+                size,
+                legacy_time * 1000,
+                cached_time * 1000,
+                legacy_time / cached_time,
+                len(queries),
+                max(len(values) for query, values in queries),
+                '{:.3f}'.format(copy_time * 1000) if copy_time else '-',
+            ))
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
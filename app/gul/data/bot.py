@@ -1,11 +1,155 @@
 import re
+import heapq
 import functools
 
-import Levenshtein
-
 from django.utils.functional import SimpleLazyObject
 
+from utils import concurrency
+from gul.data import services
 from gul.data.services import GulService
+from gul.data.index import CourseIndex, MemberIndex
+from utils.cache import Cache
+
+
+# Rendered responses, keyed by identity, intent and data version
+responses = Cache(size=5000)
+
+
+class Intent(object):
+    """Structured message, parsed once with precompiled patterns."""
+
+    RULE_SUPERVISORS = 'supervisors'
+    RULE_FIND_COURSE = 'find_course'
+    RULE_FIND_USER = 'find_user'
+    RULE_GRADES = 'grades'
+    RULE_GRADE = 'grade'
+    RULE_ASSIGNMENTS = 'assignments'
+    RULE_HELP = 'help'
+
+    # Rules in order of precedence
+    RULES = [
+        RULE_SUPERVISORS,
+        RULE_FIND_COURSE,
+        RULE_FIND_USER,
+        RULE_GRADES,
+        RULE_GRADE,
+        RULE_ASSIGNMENTS,
+        RULE_HELP,
+    ]
+
+    # Rules also tried when a rule does not handle the message
+    FALLBACK = {
+        RULE_FIND_COURSE: RULE_FIND_USER,
+    }
+
+    PATTERN_RULE = re.compile('|'.join([
+        '(?P<{}>supervisors)'.format(RULE_SUPERVISORS),
+        '(?P<{}>find course )'.format(RULE_FIND_COURSE),
+        '(?P<{}>find )'.format(RULE_FIND_USER),
+        '(?P<{}>grades)'.format(RULE_GRADES),
+        '(?P<{}>grade)'.format(RULE_GRADE),
+        '(?P<{}>assignments)'.format(RULE_ASSIGNMENTS),
+        '(?P<{}>help)'.format(RULE_HELP),
+    ]))
+
+    PATTERN_CODE = re.compile('([a-z]{3}-?[0-9]{3})')
+    PATTERN_SEPARATOR = re.compile('( *[,;] *| +and +)')
+    PATTERN_LIMIT = re.compile('limit ([0-9]+)')
+
+    PATTERN_USER_TERM = [
+        re.compile('find (.*) in'),
+        re.compile('find (.*) limit'),
+        re.compile('find (.*)'),
+    ]
+
+    PATTERN_USER_COURSE = re.compile('find .* in (.+)')
+
+    def __init__(self, text):
+
+        self.text = text.lower()
+
+        rules = set()
+        course_term = None
+
+        # Number of rule occurrences, repeated rules included
+        occurrences = 0
+
+        for match in self.PATTERN_RULE.finditer(self.text):
+            rule = match.lastgroup
+            rules.add(rule)
+            occurrences += 1
+
+            if rule in self.FALLBACK:
+                rules.add(self.FALLBACK[rule])
+
+            if rule == self.RULE_FIND_COURSE:
+                course_term = self.text[match.end():]
+
+        # Matched rules in order of precedence
+        self.rules = [rule for rule in self.RULES if rule in rules]
+
+        # Search term for courses
+        self.course_term = course_term or None
+
+        # Search term for users
+        self.user_term = None
+        if self.RULE_FIND_USER in rules:
+            for pattern in self.PATTERN_USER_TERM:
+                match = pattern.search(self.text)
+                if match:
+                    self.user_term = match.group(1) or None
+                    break
+
+        # Course to search users in
+        self.user_course_term = None
+        if self.RULE_FIND_USER in rules:
+            match = self.PATTERN_USER_COURSE.search(self.text)
+            if match:
+                self.user_course_term = match.group(1)
+
+        # Course code
+        try:
+            [code] = self.PATTERN_CODE.findall(self.text)
+            self.code = code.replace('-', '')
+        except ValueError:
+            self.code = None
+
+        # List limit
+        try:
+            [limit] = self.PATTERN_LIMIT.findall(self.text)
+            self.limit = int(limit)
+        except ValueError:
+            self.limit = None
+
+        # Parts of the message with one intent each
+        self.segments = self.split(self.text) if occurrences > 1 else [
+            self.text,
+        ]
+
+    @classmethod
+    def split(cls, text):
+        """Split text at separators between parts that match a rule.
+
+        Parts without a rule are kept with the part before them, or the part
+        after them at the start of the text.
+        """
+
+        parts = cls.PATTERN_SEPARATOR.split(text)
+
+        segments = []
+        segment = parts[0]
+
+        for separator, part in zip(parts[1::2], parts[2::2]):
+            if (cls.PATTERN_RULE.search(segment) and
+                    cls.PATTERN_RULE.search(part)):
+                segments.append(segment)
+                segment = part
+            else:
+                segment += separator + part
+
+        segments.append(segment)
+
+        return segments
 
 
 class Command(object):
@@ -17,13 +161,39 @@ class Command(object):
         gul = None
         ladok = None
 
-        def __init__(self, text, room=None):
+        # Persisted grade snapshot, gul.data.grades.GradeStore
+        grades = None
+
+        def __init__(self, text, room=None, identity=None, parent=None):
 
             self.text = text
             self.room = room
+            self.identity = identity
+
+            # Request of the whole message, if this is a part of it
+            self.parent = parent
+
+            self.intent = Intent(text)
 
             self.course = functools.lru_cache()(self.course)
 
+        def split(self):
+            """Split the request into one request per part of the message."""
+
+            if len(self.intent.segments) < 2:
+                return [self]
+
+            requests = []
+
+            for text in self.intent.segments:
+                request = type(self)(text, room=self.room,
+                                     identity=self.identity, parent=self)
+                request.use(gul=self.gul, ladok=self.ladok,
+                            grades=self.grades)
+                requests.append(request)
+
+            return requests
+
         def use(self, **attrs):
             """Provide services."""
 
@@ -33,27 +203,37 @@ class Command(object):
                 else:
                     raise ValueError('Service `{}` not allowed'.format(key))
 
+        def scoped(self):
+            """Check whether the message refers to a specific course."""
+
+            return bool(
+                self.intent.code or
+                self.intent.user_course_term or
+                self.room or
+                (self.parent and self.parent.scoped())
+            )
+
         def course(self):
             """Try to obtain a course."""
 
             assert self.gul is not None
 
-            courses = SimpleLazyObject(lambda: self.gul.courses())
+            index = SimpleLazyObject(lambda: CourseIndex.get(
+                (self.gul.identity,) if self.gul.identity else None,
+                self.gul.courses(),
+            ))
 
-            try:
-                [code] = re.findall('([a-z]{3}-?[0-9]{3})', self.text.lower())
-                code = code.replace('-', '')
-            except ValueError:
-                code = None
+            code = self.intent.code
 
             # Obtain course by code
             if code:
-                try:
-                    course = next(course for course in courses
-                                  if code in course['name'].lower())
+                course = index.by_code(code)
+                if course:
                     return course
-                except StopIteration:
-                    pass
+
+            # Obtain course from the whole message
+            if self.parent:
+                return self.parent.course()
 
             # Obtain course from active room
             if self.room:
@@ -63,35 +243,26 @@ class Command(object):
                 }
 
             # Obtain course by name similarity
-            try:
-                course = next(iter(sorted(
-                    courses,
-                    key=lambda course: (
-                        0 if course['active'] and sum([
-                            word.lower() in course['name'].lower()
-                            for word in self.text.split(' ')
-                            if len(word) >= 3
-                        ]) >= 2 else (
-                            Levenshtein.distance(self.text.lower(),
-                                                 course['name'].lower()) * {
-                                True: 1,
-                                False: 2,
-                            }[course['active']]
-                        )
-                    ),
-                )))
-                return course
-            except StopIteration:
-                pass
-
-            return None
+            return index.by_similarity(self.text)
 
     class Response(object):
         """Outgoing message."""
 
+        # Rule of the command that produced the response
+        rule = None
+
         def __init__(self, lines):
             self.text = '\n'.join(lines)
 
+    # Intent rule handled by the command
+    RULE = NotImplemented
+
+    # Whether the command waits for slow services
+    SLOW = False
+
+    # Seconds to cache responses of the command, None to disable caching
+    CACHE_TTL = None
+
     def __init__(self):
         pass
 
@@ -100,25 +271,28 @@ class Command(object):
 
         raise NotImplementedError()
 
+    def stream(self, request):
+        """Handle the specified request, yielding parts of the response as
+        they become available."""
+
+        response = self.handle(request)
+        if response:
+            yield response
+
 
 class FindCourseCommand(Command):
     """Command to search courses."""
 
-    @classmethod
-    def extract_term(cls, text):
-        """Extract search term."""
-        try:
-            [term] = re.findall('course (.*)$', text)
-            return term
-        except ValueError:
-            return None
+    RULE = Intent.RULE_FIND_COURSE
+
+    CACHE_TTL = 5 * 60
 
     def handle(self, request):
 
         if request.room and request.room.course_id:
             return None
 
-        term = self.extract_term(request.text)
+        term = request.intent.course_term
 
         # Require search term
         if not term:
@@ -141,6 +315,10 @@ class FindCourseCommand(Command):
 class FindUserCommand(Command):
     """Command to search users in a course."""
 
+    RULE = Intent.RULE_FIND_USER
+
+    CACHE_TTL = 5 * 60
+
     def format(self, member):
         return '{type} {name} <{alias}@yellow>'.format(
             type={
@@ -152,117 +330,139 @@ class FindUserCommand(Command):
             alias=member['alias'],
         )
 
-    @classmethod
-    def extract_term(cls, text):
-        """Extract search term."""
-        try:
-            [term] = re.findall('find (.*) in', text)
-            return term
-        except ValueError:
-            pass
-
-        try:
-            [term] = re.findall('find (.*) limit', text)
-            return term
-        except ValueError:
-            pass
-
-        try:
-            [term] = re.findall('find (.*)', text)
-            return term
-        except ValueError:
-            return None
+    # Minimum similarity of a confident match
+    CONFIDENCE = 0.9
 
     @classmethod
-    def extract_limit(cls, text):
-        """Extract list limit."""
-        try:
-            [limit] = re.findall('limit ([0-9]+)', text)
-            limit = int(limit)
-            return limit
-        except ValueError:
-            return None
+    def get_members(cls, request, course=None):
+        """Get list of students and supervisors."""
+        return request.gul.roster((course or request.course())['id'])
 
     @classmethod
-    def get_members(cls, request):
-        """Get list of members."""
-
-        members = []
+    def get_index(cls, request, course=None):
+        """Get search index of members."""
 
-        # Request students
-        members += request.gul.members(
-            request.course()['id'],
-            GulService.MEMBER_TYPE_STUDENT,
-        )
+        course = course or request.course()
 
-        # Request supervisors
-        members += request.gul.members(
-            request.course()['id'],
-            GulService.MEMBER_TYPE_SUPERVISOR,
+        return MemberIndex.get(
+            (request.gul.identity, course['id'])
+            if request.gul.identity else None,
+            cls.get_members(request, course),
         )
 
-        return members
-
     def handle(self, request):
 
-        term = self.extract_term(request.text)
-        limit = self.extract_limit(request.text) or 4
+        term = request.intent.user_term
+        limit = request.intent.limit or 4
 
         # Require search term and limit
         if not term or not limit:
             return None
 
+        # Search all active courses unless a course is given
+        if not request.scoped():
+            return self.handle_courses(request, term, limit)
+
         # Require a course
         if not request.course():
             return None
 
         # Obtain members in course
-        members = self.get_members(request)
+        index = self.get_index(request)
 
         # Try exact match against alias
-        try:
-            member = next(member for member in members
-                          if member['alias'] == term)
+        member = index.by_alias(term)
+        if member:
             return self.Response([
                 'Found alias {}.'.format(self.format(member)),
             ])
-        except StopIteration:
-            pass
-
-        # Sort users by similarity between name and search term
-        members = sorted(
-            members,
-            key=(lambda member: Levenshtein.jaro(term.lower(),
-                                                 member['name'].lower())),
-            reverse=True,
-        )
+
+        # Rank users by similarity between name and search term
+        members = [member for score, member in index.search(term, limit)]
 
         return self.Response([
             'Users in {} similar to \'{}\':'.format(request.course()['name'],
                                                     term),
         ] + [
             self.format(member)
-            for member in members[:limit]
+            for member in members
+        ])
+
+    def handle_courses(self, request, term, limit):
+        """Search users in all active courses.
+
+        Courses with cached members are searched first, the remaining
+        courses are fetched concurrently. The search stops as soon as the
+        alias is found or there are enough confident matches.
+        """
+
+        courses = [course for course in request.gul.courses()
+                   if course['active']]
+
+        courses.sort(key=lambda course: not request.gul.has_cached(
+            'roster', course['id']))
+
+        # Best match of each member, by alias
+        matches = {}
+
+        results = request.gul.imap(
+            lambda course: (course, self.get_index(request, course)),
+            courses,
+        )
+
+        try:
+            for course, index in results:
+
+                # Try exact match against alias
+                member = index.by_alias(term)
+                if member:
+                    return self.Response([
+                        'Found alias {} in {}.'.format(self.format(member),
+                                                       course['name']),
+                    ])
+
+                for score, member in index.search(term, limit):
+                    match = matches.get(member['alias'])
+                    if match is None or score > match[0]:
+                        matches[member['alias']] = (score, len(matches),
+                                                    member, course)
+
+                confident = sum(1 for match in matches.values()
+                                if match[0] >= self.CONFIDENCE)
+                if confident >= limit:
+                    break
+        finally:
+            results.close()
+
+        ranked = heapq.nlargest(limit, matches.values(),
+                                key=lambda match: (match[0], -match[1]))
+
+        return self.Response([
+            'Users in your courses similar to \'{}\':'.format(term),
+        ] + [
+            '{} in {}'.format(self.format(member), course['name'])
+            for score, position, member, course in ranked
         ])
 
 
 class SupervisorListCommand(Command):
     """Command to list supervisors in a course."""
 
-    def handle(self, request):
+    RULE = Intent.RULE_SUPERVISORS
 
-        if 'supervisors' not in request.text.lower():
-            return None
+    CACHE_TTL = 10 * 60
+
+    def handle(self, request):
 
         # Require a course
         if not request.course():
             return None
 
         # Request supervisors
-        supervisors = request.gul.members(
-            request.course()['id'],
-            GulService.MEMBER_TYPE_SUPERVISOR,
-        )
+        supervisors = [
+            member for member in request.gul.roster(request.course()['id'])
+            if member['type'] == GulService.MEMBER_TYPE_SUPERVISOR
+        ]
 
         return self.Response([
             'Supervisors for {}:'.format(request.course()['name']),
@@ -279,41 +479,72 @@ class SupervisorListCommand(Command):
 class CourseGradeCommand(Command):
     """Command to get the grade for a course."""
 
-    def handle(self, request):
+    RULE = Intent.RULE_GRADE
 
-        if 'grade' not in request.text.lower():
-            return
+    SLOW = True
 
-        # Require a course
-        if not request.course():
-            return None
+    CACHE_TTL = 10 * 60
+
+    @classmethod
+    def get_code(cls, request):
+        """Get the course code from the course name."""
+
+        name = request.course()['name']
+        if request.room and request.room.course_id == request.course()['id']:
+            name = request.room.course_name
 
-        # Get course code
         try:
-            [code] = re.findall('([a-z]{3}-?[0-9]{3})',
-                                request.course()['name'].lower())
-            code = code.replace('-', '')
+            [code] = Intent.PATTERN_CODE.findall(name.lower())
         except ValueError:
             return None
 
+        return code.replace('-', '').upper()
+
+    @classmethod
+    def get_course(cls, request, code):
+        """Get the Ladok course with the specified code."""
+
+        # Use the persisted snapshot if available
+        if request.grades:
+            return request.grades.get(code)
+
         # Request courses
         courses = request.ladok.courses()
 
-        try:
-            course = next(course for course in courses
-                          if course['code'].lower() == code)
-
-            if course['grade']:
-                text = 'You got {} for {} ({} credits)'.format(
-                    course['grade'],
-                    course['name'],
-                    course['credits'],
-                )
-            else:
-                text = '{} ({} credits) has not been graded yet.'.format(
-                    course['name'], course['credits'])
-        except StopIteration:
-            text = 'Course {} not found.'.format(code)
+        return next((course for course in courses
+                     if course['code'].upper() == code), None)
+
+    def handle(self, request):
+
+        # Require a course
+        if not request.course():
+            return None
+
+        # Get course code, mapped from the course id once known
+        code = request.grades.code(request.course()['id']) \
+            if request.grades else None
+
+        if not code:
+            code = self.get_code(request)
+            if not code:
+                return None
+
+            if request.grades:
+                request.grades.map(request.course()['id'], code)
+
+        course = self.get_course(request, code)
+
+        if course is None:
+            text = 'Course {} not found.'.format(code.lower())
+        elif course['grade']:
+            text = 'You got {} for {} ({} credits)'.format(
+                course['grade'],
+                course['name'],
+                course['credits'],
+            )
+        else:
+            text = '{} ({} credits) has not been graded yet.'.format(
+                course['name'], course['credits'])
 
         return self.Response([text])
 
@@ -321,10 +552,25 @@ class CourseGradeCommand(Command):
 class CourseAssignmentListCommand(Command):
     """Command to list assignments for a course."""
 
-    def handle(self, request):
+    RULE = Intent.RULE_ASSIGNMENTS
 
-        if 'assignments' not in request.text.lower():
-            return None
+    SLOW = True
+
+    CACHE_TTL = 60
+
+    def format(self, assignment):
+        return '\n{} {}\nGroup: {}\n{}'.format(
+            assignment['name'],
+            assignment['url'],
+            assignment['group'] or 'Not set',
+            'Due {}'.format(assignment['deadline'])
+            if assignment['status'] in (
+                GulService.ASSIGNMENT_STATUS_PENDING,
+                GulService.ASSIGNMENT_STATUS_RESUBMIT,
+            ) else assignment['status'].capitalize()
+        )
+
+    def handle(self, request):
 
         # Require a course
         if not request.course():
@@ -336,29 +582,38 @@ class CourseAssignmentListCommand(Command):
         return self.Response([
             'Assignments for {}:'.format(request.course()['name']),
         ] + [
-            '\n{} {}\nGroup: {}\n{}'.format(
-                assignment['name'],
-                assignment['url'],
-                assignment['group'] or 'Not set',
-                'Due {}'.format(assignment['deadline'])
-                if assignment['status'] in (
-                    GulService.ASSIGNMENT_STATUS_PENDING,
-                    GulService.ASSIGNMENT_STATUS_RESUBMIT,
-                ) else assignment['status'].capitalize()
-            )
+            self.format(assignment)
             for assignment in
             sorted(assignments,
                    key=lambda assignment: assignment['id'])
         ])
 
+    def stream(self, request):
+
+        # Require a course
+        if not request.course():
+            return
+
+        yield self.Response([
+            'Assignments for {}:'.format(request.course()['name']),
+        ])
+
+        # Request assignments as they are parsed
+        for assignment in request.gul.iter_assignments(
+                request.course()['id']):
+            yield self.Response([self.format(assignment)])
+
 
 class GradeListCommand(Command):
     """Command to list all grades."""
 
-    def handle(self, request):
+    RULE = Intent.RULE_GRADES
 
-        if 'grades' not in request.text.lower():
-            return
+    SLOW = True
+
+    CACHE_TTL = 10 * 60
+
+    def handle(self, request):
 
         # Request courses
         courses = request.ladok.courses()
@@ -378,10 +633,9 @@ class GradeListCommand(Command):
 class HelpCommand(Command):
     """Command to show bot help."""
 
-    def handle(self, request):
+    RULE = Intent.RULE_HELP
 
-        if 'help' not in request.text.lower():
-            return
+    def handle(self, request):
 
         return self.Response([
             'Course room help:',
@@ -401,17 +655,135 @@ class HelpCommand(Command):
 
 class Handler(object):
 
+    # Number of parts of a message handled concurrently
+    WORKERS = 4
+
     def __init__(self, commands):
         self.commands = commands
+        self.routes = {command.RULE: command for command in commands}
+
+    def cache_key(self, request, version):
+        """Get the cache key of the response to a request, or None if the
+        response can not be cached."""
+
+        if request.identity is None or version is None:
+            return None
+
+        return (
+            request.identity,
+            tuple(request.intent.rules),
+            ' '.join(request.intent.text.split()),
+            ' '.join(request.parent.intent.text.split())
+            if request.parent else None,
+            request.room.course_id if request.room else None,
+            version,
+        )
 
     def handle(self, request):
-        for command in self.commands:
-            response = command.handle(request)
+        """Handle the request, handling each part of a message with several
+        intents concurrently and combining the responses in order."""
+
+        requests = request.split()
+        if len(requests) < 2:
+            return self.respond(request)
+
+        parts = [
+            response for response in
+            concurrency.map(self.respond, requests, workers=self.WORKERS)
+            if response.rule
+        ]
+
+        if not parts:
+            return Command.Response(['I have no idea what to do.'])
+
+        response = Command.Response([
+            '\n\n'.join(part.text for part in parts),
+        ])
+        response.rule = parts[0].rule
+
+        return response
+
+    def respond(self, request):
+        """Handle the request, reusing the response to an identical request
+        as long as the underlying service data has not changed."""
+
+        key = self.cache_key(request, services.version(request.identity))
+        if key is not None:
+            response = responses.get(key)
+            if response is not None:
+                return response
+
+        response = self.dispatch(request)
+
+        ttl = (self.routes[response.rule].CACHE_TTL
+               if response.rule in self.routes else None)
+
+        # Use the version of the data the response was built from
+        key = self.cache_key(request, services.version(request.identity))
+        if key is not None and ttl is not None:
+            responses.set(key, response, ttl=ttl)
+
+        return response
+
+    def dispatch(self, request):
+        """Handle the request with the first command that accepts it."""
+
+        for rule in request.intent.rules:
+            command = self.routes.get(rule)
+            response = command.handle(request) if command else None
             if response:
+                response.rule = rule
                 return response
 
         return Command.Response(['I have no idea what to do.'])
 
+    def slow(self, request):
+        """Check whether handling the request may wait for slow services."""
+
+        return any(self.routes[rule].SLOW
+                   for rule in request.intent.rules
+                   if rule in self.routes)
+
+    def stream(self, request):
+        """Handle the request, yielding parts of the response as they become
+        available."""
+
+        requests = request.split()
+        if len(requests) < 2:
+            yield from self.stream_one(request)
+            return
+
+        handled = False
+
+        for request in requests:
+            for response in self.stream_one(request):
+                if response.rule:
+                    handled = True
+                    yield response
+
+        if not handled:
+            yield Command.Response(['I have no idea what to do.'])
+
+    def stream_one(self, request):
+        """Stream the response to a request with a single intent."""
+
+        for rule in request.intent.rules:
+            command = self.routes.get(rule)
+            if not command:
+                continue
+
+            handled = False
+
+            for response in command.stream(request):
+                handled = True
+                response.rule = rule
+                yield response
+
+            if handled:
+                return
+
+        yield Command.Response(['I have no idea what to do.'])
+
 
 handler = Handler([
     SupervisorListCommand(),
@@ -0,0 +1,153 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from utils import concurrency
+from gul.models import CourseCode, Grade, SnapshotSync
+
+
+class GradeStore(object):
+    """Persisted snapshot of the Ladok grades of an identity.
+
+    Grades are looked up by Ladok course code, which is mapped from GUL
+    course ids. The snapshot is synchronized from Ladok when a code is
+    missing from it, and refreshed in the background once it is stale.
+    """
+
+    # Seconds until the snapshot is refreshed
+    REFRESH = 10 * 60
+
+    FIELDS = ('code', 'name', 'credits', 'grade', 'synced_at')
+
+    def __init__(self, identity, ladok):
+        self.identity = identity
+        self.ladok = ladok
+
+    ################
+    # COURSE CODES #
+    ################
+
+    def code(self, course_id):
+        """Get the Ladok course code of a GUL course, if known."""
+
+        return CourseCode.objects.filter(
+            course_id=course_id,
+        ).values_list('code', flat=True).first()
+
+    def map(self, course_id, code):
+        """Remember the Ladok course code of a GUL course."""
+
+        CourseCode(course_id=course_id, code=code).insert_if_not_exists()
+
+    ##########
+    # GRADES #
+    ##########
+
+    def expiry(self):
+        return timezone.now() - timedelta(seconds=self.REFRESH)
+
+    def get_sync_key(self):
+        return 'grades:{}'.format(self.identity.pk)
+
+    def synced_at(self):
+        """Get the time of the last sync, or None."""
+
+        return SnapshotSync.objects.filter(
+            key=self.get_sync_key(),
+        ).values_list('synced_at', flat=True).first()
+
+    def get(self, code):
+        """Get the snapshot of the grade for a course code, or None if the
+        identity has not taken the course."""
+
+        queryset = Grade.objects.filter(identity=self.identity, code=code)
+
+        grade = queryset.values(*self.FIELDS).first()
+
+        synced_at = self.synced_at()
+        expired = synced_at is None or synced_at < self.expiry()
+
+        if grade is None:
+            # Synchronize unknown codes, unless the snapshot is recent
+            if expired:
+                self.sync()
+                grade = queryset.values(*self.FIELDS).first()
+
+        elif expired:
+            self.refresh()
+
+        return grade
+
+    def refresh(self):
+        """Synchronize the snapshot in the background."""
+        concurrency.spawn_once(self.get_sync_key(), self.sync)
+
+    def sync(self):
+        """Synchronize the snapshot with the courses in Ladok.
+
+        Only new, changed and removed courses are written, the remaining
+        grades are just marked as synchronized. Returns the courses.
+        """
+
+        data = self.ladok.fetch('courses')
+
+        courses = {course['code'].upper(): course for course in data}
+
+        now = timezone.now()
+
+        with transaction.atomic():
+            grades = {grade.code: grade for grade in
+                      Grade.objects.filter(identity=self.identity)}
+
+            created = [
+                Grade(
+                    identity=self.identity,
+                    code=code,
+                    name=course['name'],
+                    credits=course['credits'],
+                    grade=course['grade'],
+                    synced_at=now,
+                )
+                for code, course in courses.items() if code not in grades
+            ]
+
+            if created:
+                Grade.insert_if_not_exist(created)
+
+            unchanged = []
+
+            for code, grade in grades.items():
+                course = courses.get(code)
+                if course is None:
+                    continue
+
+                if (grade.name, grade.credits, grade.grade) == (
+                        course['name'], course['credits'], course['grade']):
+                    unchanged.append(code)
+                else:
+                    Grade.objects.filter(pk=grade.pk).update(
+                        name=course['name'],
+                        credits=course['credits'],
+                        grade=course['grade'],
+                        synced_at=now,
+                    )
+
+            Grade.objects.filter(
+                identity=self.identity,
+                code__in=unchanged,
+            ).update(synced_at=now)
+
+            Grade.objects.filter(
+                identity=self.identity,
+            ).exclude(
+                code__in=list(courses),
+            ).delete()
+
+            SnapshotSync(
+                identity=self.identity,
+                key=self.get_sync_key(),
+                synced_at=now,
+            ).upsert(update=('synced_at',))
+
+        return data
@@ -0,0 +1,162 @@
+import re
+import heapq
+import collections
+
+import Levenshtein
+
+from utils.cache import Cache
+
+
+class Index(object):
+    """Search index built from a list of items."""
+
+    # Indexes shared between requests
+    cache = Cache(size=1000, ttl=60 * 60)
+
+    def __init__(self, items):
+        self.items = items
+
+    @classmethod
+    def get(cls, key, items):
+        """Get an index of the items, reusing the index stored for the key if
+        it was built from the same items."""
+
+        if key is None:
+            return cls(items)
+
+        key = tuple(key) + (cls.__name__,)
+
+        index = cls.cache.get(key)
+        if index is None or (index.items is not items and
+                             index.items != items):
+            index = cls(items)
+            cls.cache.set(key, index)
+
+        return index
+
+
+class CourseIndex(Index):
+    """Index of courses by course code and name words."""
+
+    PATTERN_CODE = re.compile('[a-z]{3}-?[0-9]{3}')
+    PATTERN_WORD = re.compile('\\w+')
+
+    # Minimum length of words matched against course names
+    WORD_LENGTH = 3
+
+    # Minimum number of matching words for an active course to be selected
+    WORD_HITS = 2
+
+    def __init__(self, courses):
+        super().__init__(courses)
+
+        self.names = [course['name'].lower() for course in courses]
+
+        self.codes = {}
+        self.words = collections.defaultdict(list)
+
+        for position, name in enumerate(self.names):
+            for code in self.PATTERN_CODE.findall(name):
+                self.codes.setdefault(code.replace('-', ''), position)
+
+            for word in set(self.PATTERN_WORD.findall(name)):
+                self.words[word].append(position)
+
+    def by_code(self, code):
+        """Get the first course with the specified code."""
+
+        position = self.codes.get(code.replace('-', ''))
+        return self.items[position] if position is not None else None
+
+    def by_similarity(self, text):
+        """Get the course most similar to the specified text.
+
+        The first active course sharing enough words with the text is
+        selected, otherwise the course with the name closest to the text,
+        preferring active courses.
+        """
+
+        if not self.items:
+            return None
+
+        text = text.lower()
+
+        hits = collections.Counter()
+
+        for word in self.PATTERN_WORD.findall(text):
+            if len(word) >= self.WORD_LENGTH:
+                hits.update(self.words.get(word, ()))
+
+        positions = [position for position, count in hits.items()
+                     if count >= self.WORD_HITS and
+                     self.items[position]['active']]
+        if positions:
+            return self.items[min(positions)]
+
+        position = min(
+            range(len(self.items)),
+            key=lambda position: (
+                Levenshtein.distance(text, self.names[position]) *
+                (1 if self.items[position]['active'] else 2)
+            ),
+        )
+
+        return self.items[position]
+
+
+class MemberIndex(Index):
+    """Index of members by alias and name trigrams."""
+
+    # Length of name fragments used to find candidates
+    GRAM = 3
+
+    def __init__(self, members):
+        super().__init__(members)
+
+        self.names = [member['name'].lower() for member in members]
+
+        self.aliases = {}
+        self.grams = collections.defaultdict(set)
+
+        for position, member in enumerate(members):
+            self.aliases.setdefault(member['alias'], member)
+
+            for gram in self.get_grams(self.names[position]):
+                self.grams[gram].add(position)
+
+    @classmethod
+    def get_grams(cls, text):
+        """Get the set of name fragments of the text."""
+
+        text = ' {} '.format(text)
+        return {text[i:i + cls.GRAM]
+                for i in range(len(text) - cls.GRAM + 1)}
+
+    def by_alias(self, alias):
+        """Get the member with the specified alias."""
+        return self.aliases.get(alias)
+
+    def search(self, term, limit):
+        """Get the members with names most similar to the search term.
+
+        Only members sharing a name fragment with the term are ranked, unless
+        there are fewer of those than the limit. Returns a list of tuples of
+        similarity and member, most similar first.
+        """
+
+        term = term.lower()
+
+        positions = set()
+        for gram in self.get_grams(term):
+            positions.update(self.grams.get(gram, ()))
+
+        if len(positions) < limit:
+            positions = range(len(self.items))
+
+        ranked = heapq.nlargest(limit, (
+            (Levenshtein.jaro(term, self.names[position]), -position)
+            for position in positions
+        ))
+
+        return [(score, self.items[-position])
+                for score, position in ranked]
@@ -0,0 +1,127 @@
+import time
+import uuid
+import logging
+from datetime import timedelta
+
+from django.core.exceptions import PermissionDenied
+from django.utils import timezone
+from rest_framework.exceptions import APIException
+
+from utils import concurrency
+from gul.models import Job as StoredJob
+
+
+logger = logging.getLogger(__name__)
+
+# Errors of failed jobs, for unexpected exceptions
+ERROR = 'Could not handle message.'
+ERROR_PERMISSION = 'Permission denied.'
+
+# Seconds until jobs are removed
+TTL = 10 * 60
+
+
+class Job(object):
+    """Work done in the background, producing results in parts.
+
+    Jobs are stored in the database, so that any process can be polled for
+    the parts of a job.
+    """
+
+    # Seconds between checks for new parts while waiting
+    POLL = 0.25
+
+    def __init__(self, id, owner=None, parts=None, done=False, error=None):
+        self.id = id
+        self.owner = owner
+
+        self.parts = parts or []
+        self.done = done
+        self.error = error
+
+    @classmethod
+    def from_stored(cls, job):
+        return cls(job.id, owner=job.owner, parts=job.parts, done=job.done,
+                   error=job.error)
+
+    def queryset(self):
+        return StoredJob.objects.filter(id=self.id)
+
+    def append(self, part):
+        """Add a result part."""
+
+        self.parts.append(part)
+        self.queryset().update(parts=self.parts)
+
+    def finish(self, error=None):
+        """Mark the job as done."""
+
+        self.done = True
+        self.error = error
+        self.queryset().update(done=True, error=error)
+
+    def load(self):
+        """Read the parts and state of the job."""
+
+        job = self.queryset().first()
+        if job is not None:
+            self.parts, self.done, self.error = job.parts, job.done, job.error
+
+    def wait(self, after=0, timeout=None):
+        """Wait until there are parts after the specified index or the job is
+        done. Returns the new parts and whether the job is done."""
+
+        deadline = time.monotonic() + (timeout or 0)
+
+        while len(self.parts) <= after and not self.done:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+
+            time.sleep(min(self.POLL, remaining))
+            self.load()
+
+        return self.parts[after:], self.done
+
+
+def start(owner, function, *args, **kwargs):
+    """Start a job running function in a background thread.
+
+    Function gets the job as first argument, and adds parts to it.
+    """
+
+    StoredJob.objects.filter(
+        created_at__lt=timezone.now() - timedelta(seconds=TTL),
+    ).delete()
+
+    job = Job.from_stored(
+        StoredJob.objects.create(id=uuid.uuid4().hex, owner=owner))
+
+    def run():
+        try:
+            function(job, *args, **kwargs)
+        except PermissionDenied:
+            job.finish(error=ERROR_PERMISSION)
+        except APIException as error:
+            job.finish(error=str(error.detail))
+        except Exception:
+            logger.exception('Failed to run job %s', job.id)
+            job.finish(error=ERROR)
+        else:
+            job.finish()
+
+    concurrency.spawn(run)
+
+    return job
+
+
+def get(id, owner=None):
+    """Get job with the specified id and owner."""
+
+    job = StoredJob.objects.filter(
+        id=id,
+        owner=owner,
+        created_at__gte=timezone.now() - timedelta(seconds=TTL),
+    ).first()
+
+    return Job.from_stored(job) if job is not None else None
@@ -0,0 +1,118 @@
+import threading
+
+from utils.cache import Cache
+from gul.models import Room
+
+
+class RoomDirectory(object):
+    """In-memory directory of rooms by room id and by course id.
+
+    Rooms are loaded from the database when first requested. The version
+    changes whenever rooms are written, which invalidates synchronized course
+    lists. Entries expire so that rooms written by other processes are
+    eventually seen.
+    """
+
+    # Seconds until rooms are reloaded from the database
+    TTL = 60 * 60
+
+    def __init__(self, size=10000, ttl=TTL):
+        self.by_room = Cache(size=size, ttl=ttl)
+        self.by_course = Cache(size=size, ttl=ttl)
+
+        # Versions of the directory at which course lists were synchronized
+        self.synced = Cache(size=size, ttl=ttl)
+
+        self.version = 0
+        self.lock = threading.Lock()
+
+    def add(self, rooms):
+        for room in rooms:
+            self.by_room.set((room.room_id,), room)
+            self.by_course.set((room.course_id,), room)
+
+    def changed(self):
+        with self.lock:
+            self.version += 1
+
+    def invalidate(self):
+        """Forget all rooms."""
+
+        self.by_room.clear()
+        self.by_course.clear()
+        self.changed()
+
+    def get(self, room_id):
+        """Get the room with the specified room id, or None."""
+
+        return self.get_many([room_id]).get(room_id)
+
+    def get_many(self, room_ids):
+        """Get a dict of rooms by room id, for room ids that exist."""
+
+        rooms = {}
+        missing = []
+
+        for room_id in set(room_ids):
+            room = self.by_room.get((room_id,))
+            if room is None:
+                missing.append(room_id)
+            else:
+                rooms[room_id] = room
+
+        if missing:
+            loaded = list(Room.objects.filter(room_id__in=missing))
+            self.add(loaded)
+            rooms.update((room.room_id, room) for room in loaded)
+
+        return rooms
+
+    def sync(self, courses):
+        """Get the rooms of the specified courses, creating missing rooms.
+
+        The database is skipped if the same course list was synchronized
+        since rooms were last written, and only courses without a room or
+        with a changed name are written.
+        """
+
+        digest = hash(tuple((course['id'], course['name'])
+                            for course in courses))
+
+        rooms = {}
+        missing = []
+
+        for course in courses:
+            room = self.by_course.get((course['id'],))
+            if room is None:
+                missing.append(course['id'])
+            else:
+                rooms[course['id']] = room
+
+        if not missing and self.synced.get((digest,)) == self.version:
+            return [rooms[course['id']] for course in courses]
+
+        if missing:
+            loaded = list(Room.objects.filter(course_id__in=missing))
+            self.add(loaded)
+            rooms.update((room.course_id, room) for room in loaded)
+
+        changed = [
+            Room(course_id=course['id'], course_name=course['name'])
+            for course in courses
+            if course['id'] not in rooms or
+            rooms[course['id']].course_name != course['name']
+        ]
+
+        if changed:
+            written = Room.upsert_all(changed, update=('course_name',))
+            self.add(written)
+            rooms.update((room.course_id, room) for room in written)
+            self.changed()
+
+        self.synced.set((digest,), self.version)
+
+        return [rooms[course['id']] for course in courses]
+
+
+# Rooms shared between requests
+directory = RoomDirectory()
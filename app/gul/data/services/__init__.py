@@ -1,3 +1,4 @@
+from .base import cache, invalidate, version  # noqa
 from .gul import GulService
 from .ladok import LadokService
 from .account import AccountService
@@ -1,14 +1,100 @@
 from urllib.parse import urlparse
+import functools
+import itertools
 
 import requests
 
+from utils import concurrency
+from utils.cache import Cache
+
+
+# Service results shared between requests, keyed by identity
+cache = Cache(size=10000)
+
+# Digests of cached service results, keyed like the results themselves
+digests = Cache(size=10000)
+
+# Version of the service data of each identity, changed whenever a cached
+# result differs from the previous one
+versions = Cache(size=10000)
+
+# Versions are unique across identities, so that a version is never reused
+counter = itertools.count(1)
+
+
+def cached(ttl):
+    """Cache method results for the identity of the service.
+
+    @cached(ttl=60)
+    def method(self, *args):
+        pass
+    """
+
+    def decorate(method):
+
+        @functools.wraps(method)
+        def wrapper(self, *args):
+            if self.identity is None:
+                return method(self, *args)
+
+            key = self.cache_key(method.__name__, *args)
+
+            value = cache.get(key, Cache.MISSING)
+            if value is Cache.MISSING:
+                value = method(self, *args)
+                store(key, value, ttl=ttl)
+
+            return value
+
+        return wrapper
+
+    return decorate
+
+
+def store(key, value, ttl=None):
+    """Cache a service result, changing the data version of the identity if
+    the result differs from the previous one."""
+
+    identity = key[0]
+
+    cache.set(key, value, ttl=ttl)
+
+    digest = hash(repr(value))
+    if digests.get(key) != digest:
+        digests.set(key, digest)
+        versions.set((identity,), next(counter))
+
+
+def version(identity):
+    """Get the data version of the specified identity.
+
+    Returns None if the version is unknown, i.e. no service results have been
+    cached for the identity yet.
+    """
+
+    return versions.get((identity,))
+
+
+def invalidate(identity):
+    """Remove cached service results for the specified identity."""
+
+    cache.invalidate(identity)
+    digests.invalidate(identity)
+    versions.set((identity,), next(counter))
+
 
 class Service(object):
 
     NAME = NotImplemented
 
-    def __init__(self, session=None):
+    # Number of threads used by map and imap. Requests in flight to the
+    # service host are limited by transport.HOST_CONCURRENCY, however the
+    # calls are nested.
+    CONCURRENCY = 4
+
+    def __init__(self, session=None, identity=None):
         self.session = session
+        self.identity = identity
 
     def host(self):
         raise NotImplementedError()
@@ -16,8 +102,32 @@ class Service(object):
     def url(self):
         raise NotImplementedError()
 
-    def valid(self):
-        raise NotImplementedError()
+    def cache_key(self, method, *args):
+        """Get the cache key of a method call."""
+        return (self.identity, self.NAME, method) + args
+
+    def has_cached(self, method, *args):
+        """Check whether the result of a method call is cached."""
+        return self.identity is not None and cache.get(
+            self.cache_key(method, *args), Cache.MISSING) is not Cache.MISSING
+
+    def fetch(self, method, *args):
+        """Call a cached method, replacing its cached result with fresh
+        data."""
+
+        if self.identity is not None:
+            cache.delete(self.cache_key(method, *args))
+
+        return getattr(self, method)(*args)
+
+    def map(self, function, iterable):
+        """Apply function to each item with concurrent requests."""
+        return concurrency.map(function, iterable, workers=self.CONCURRENCY)
+
+    def imap(self, function, iterable):
+        """Apply function to each item with concurrent requests, yielding
+        results as they arrive."""
+        return concurrency.imap(function, iterable, workers=self.CONCURRENCY)
 
     ########
     # AUTH #
@@ -37,6 +147,21 @@ class Service(object):
 
         return urlparse(response.url).hostname == self.host()
 
+    def valid(self):
+        """Check whether the service session is still authorized.
+
+        Requesting the service also keeps the session alive. An expired
+        session is redirected to the login host.
+        """
+
+        assert self.session is not None
+
+        response = self.session.get(self.url())
+        if response.status_code != requests.codes.ok:
+            return False
+
+        return urlparse(response.url).hostname == self.host()
+
     def logout(self):
         """Logout from service."""
 
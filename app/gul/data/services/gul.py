@@ -1,14 +1,14 @@
 import re
-import functools
+import collections
 from datetime import datetime, timedelta
 from urllib.parse import urljoin, urlencode
 
 import requests
-import bs4
 from dateutil.parser import parse
 from pytz import timezone
 
-from gul.data.services.base import Service
+from gul.data.services.base import Service, cache, cached, store
+from gul.data import soup
 
 
 class GulService(Service):
@@ -18,10 +18,8 @@ class GulService(Service):
     BASE = 'https://{}/login/processlogin'.format(HOST)
     TARGET = '/startPage.do'
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-
-        self.courses = functools.lru_cache()(self.courses)
+    # Time zone of scraped dates and times
+    TIME_ZONE = 'Europe/Stockholm'
 
     def host(self):
         return self.HOST
@@ -35,12 +33,13 @@ class GulService(Service):
     # SERVICE #
     ###########
 
+    @cached(ttl=10 * 60)
     def courses(self):
 
         response = self.session.get(urljoin(self.BASE, '/listCourses.do'))
         assert response.status_code == requests.codes.ok
 
-        document = bs4.BeautifulSoup(response.text, 'html.parser')
+        document = soup.parse(response.text, id='myCourses')
 
         data = []
 
@@ -75,22 +74,105 @@ class GulService(Service):
     MEMBER_TYPE_STUDENT = 'participant'
     MEMBER_TYPE_SUPERVISOR = 'teacher'
 
+    MEMBERS_TTL = 10 * 60
+    MEMBERS_PAGE_SIZE = 100
+
+    @cached(ttl=MEMBERS_TTL)
     def members(self, course_id, member_type):
         """Get the list of members in the specified course."""
 
+        pages = sorted(self.iter_member_pages(course_id, member_type),
+                       key=lambda page: page[0])
+
+        return [member for page, data in pages for member in data]
+
+    @cached(ttl=MEMBERS_TTL)
+    def roster(self, course_id):
+        """Get the list of students and supervisors in the specified course.
+
+        Both lists are fetched concurrently. Members are de-duplicated by
+        alias, a member listed as both keeps the supervisor type.
+        """
+
+        lists = self.map(
+            lambda member_type: self.members(course_id, member_type),
+            [self.MEMBER_TYPE_STUDENT, self.MEMBER_TYPE_SUPERVISOR],
+        )
+
+        data = collections.OrderedDict()
+
+        for members in lists:
+            for member in members:
+                if (member['alias'] not in data or
+                        member['type'] == self.MEMBER_TYPE_SUPERVISOR):
+                    data[member['alias']] = member
+
+        return list(data.values())
+
+    def iter_members(self, course_id, member_type):
+        """Iterate over members in the specified course as pages arrive.
+
+        Cached members are used if available, and the complete list is cached
+        once all pages have been fetched.
+        """
+
+        key = self.cache_key('members', course_id, member_type)
+
+        data = cache.get(key) if self.identity is not None else None
+        if data is not None:
+            yield from data
+            return
+
+        pages = []
+
+        for page, data in self.iter_member_pages(course_id, member_type):
+            pages.append((page, data))
+            yield from data
+
+        if self.identity is not None:
+            pages.sort(key=lambda page: page[0])
+            store(key, [member for page, data in pages for member in data],
+                  ttl=self.MEMBERS_TTL)
+
+    def iter_member_pages(self, course_id, member_type):
+        """Iterate over pages of members as they arrive.
+
+        The first page gives the number of pages, the remaining pages are
+        fetched concurrently. Yields tuples of page number and members.
+        """
+
+        data, count = self.member_page(course_id, member_type, 0)
+        yield 0, data
+
+        yield from self.imap(
+            lambda page: (page, self.member_page(course_id, member_type,
+                                                 page)[0]),
+            range(1, count),
+        )
+
+    def member_page(self, course_id, member_type, page):
+        """Get a page of members and the number of pages."""
+
         response = self.session.get('{}?{}'.format(
             urljoin(self.BASE,
                     '/courseId/{}/courseParticipants.do'.format(course_id)),
             urlencode({
-                'tableCurrentPageparticipantList': 0,
+                'tableCurrentPageparticipantList': page,
                 'listType': member_type,
-                'tablePageSizeparticipantList': 100,
+                'tablePageSizeparticipantList': self.MEMBERS_PAGE_SIZE,
             }),
         ))
 
         assert response.status_code == requests.codes.ok
 
-        document = bs4.BeautifulSoup(response.text, 'html.parser')
+        # Pager links refer to every page of the list
+        count = max([page] + [
+            int(number) for number in
+            re.findall('tableCurrentPageparticipantList=([0-9]+)',
+                       response.text)
+        ]) + 1
+
+        document = soup.parse(response.text, id='participantList')
 
         data = []
 
@@ -107,7 +189,7 @@ class GulService(Service):
                 'type': member_type,
             })
 
-        return data
+        return data, count
 
     ASSIGNMENT_STATUS_PENDING = 'pending'
     ASSIGNMENT_STATUS_MARKING = 'marking'
@@ -115,18 +197,63 @@ class GulService(Service):
     ASSIGNMENT_STATUS_RESUBMITTED = 'resubmitted'
     ASSIGNMENT_STATUS_COMPLETED = 'completed'
 
+    ASSIGNMENTS_TTL = 2 * 60
+
+    @cached(ttl=ASSIGNMENTS_TTL)
     def assignments(self, course_id):
         """Get the list of assignments from the specified course."""
 
+        data = self.map(
+            lambda content: self.assignment(course_id, *content),
+            self.contents(course_id),
+        )
+
+        return [fields for fields in data if fields is not None]
+
+    def iter_assignments(self, course_id):
+        """Iterate over assignments from the specified course as they are
+        parsed.
+
+        Cached assignments are used if available, and the complete list is
+        cached once all assignments have been parsed.
+        """
+
+        key = self.cache_key('assignments', course_id)
+
+        data = cache.get(key) if self.identity is not None else None
+        if data is not None:
+            yield from data
+            return
+
+        contents = self.contents(course_id)
+        data = {}
+
+        for id, fields in self.imap(
+                lambda content: (content[0],
+                                 self.assignment(course_id, *content)),
+                contents):
+            if fields is not None:
+                data[id] = fields
+                yield fields
+
+        if self.identity is not None:
+            store(key, [data[id] for id, name, href in contents
+                        if id in data],
+                  ttl=self.ASSIGNMENTS_TTL)
+
+    def contents(self, course_id):
+        """Get tuples of id, name and link of contents in the specified
+        course."""
+
         response = self.session.get(
             urljoin(self.BASE,
                     '/courseId/{}/contentStart.do'.format(course_id)))
 
         assert response.status_code == requests.codes.ok
 
-        document = bs4.BeautifulSoup(response.text, 'html.parser')
+        document = soup.parse(response.text, id='courseMainBox')
 
-        data = []
+        contents = []
 
         for content in document.select('#courseMainBox .treeNodeText'):
             a = content.find('a')
@@ -134,100 +261,105 @@ class GulService(Service):
             id = int(re.findall('id=([0-9]*)', href)[0])
             name = a.text
 
-            response = self.session.get(
-                urljoin(
-                    self.BASE,
-                    ('/pp/courses/course{}/published/0/resourceId/0'
-                     '/content/contentFrame.do?id={}').format(course_id, id)))
-            if response.status_code != requests.codes.ok:
-                continue
+            contents.append((id, name, href))
 
-            document = bs4.BeautifulSoup(response.text, 'html.parser')
-            submission = document.select('#ppReportSubmission')
-            if not submission:
-                continue
+        return contents
 
-            submission = submission[0]
+    def assignment(self, course_id, id, name, href):
+        """Get the details of the specified assignment content."""
 
-            group = submission.find('h2').text.strip()
+        response = self.session.get(
+            urljoin(
+                self.BASE,
+                ('/pp/courses/course{}/published/0/resourceId/0'
+                 '/content/contentFrame.do?id={}').format(course_id, id)))
+        if response.status_code != requests.codes.ok:
+            return None
 
-            prompt = submission.select('.rsPrompt')[0]
-            prompt = prompt.decode_contents(formatter='html')
+        document = soup.parse(response.text, id='ppReportSubmission')
+        submission = document.select('#ppReportSubmission')
+        if not submission:
+            return None
 
-            fields = {
-                'id': id,
-                'name': name,
-                'group': group if 'group' in group.lower() else None,
-                'url': urljoin(self.BASE, href),
-            }
+        submission = submission[0]
 
-            match = re.findall(
-                '<strong>(.*):<\/strong>[\n\r\s]*(.*)[\n\r\s]*<br\/>',
-                str(submission.select('.rsBox')[0])
-            )
+        group = submission.find('h2').text.strip()
 
-            for label, text in match:
-                label = label.lower().strip()
-                text = text.lower().strip()
+        prompt = submission.select('.rsPrompt')[0]
+        prompt = prompt.decode_contents(formatter='html')
 
-                if label in ('status', 'status'):
+        fields = {
+            'id': id,
+            'name': name,
+            'group': group if 'group' in group.lower() else None,
+            'url': urljoin(self.BASE, href),
+        }
 
-                    value = None
+        match = re.findall(
+            '<strong>(.*):<\/strong>[\n\r\s]*(.*)[\n\r\s]*<br\/>',
+            str(submission.select('.rsBox')[0])
+        )
 
-                    if text in ('not yet submitted',
-                                'ej inlämnad'):
-                        value = self.ASSIGNMENT_STATUS_PENDING
+        for label, text in match:
+            label = label.lower().strip()
+            text = text.lower().strip()
 
-                    if text in ('to be marked', 'ogranskad'):
-                        value = self.ASSIGNMENT_STATUS_MARKING
+            if label in ('status', 'status'):
 
-                    if text in ('revision required',
-                                'kompletteras'):
-                        value = self.ASSIGNMENT_STATUS_RESUBMIT
+                value = None
 
-                    if text in ('revision submitted',
-                                'komplettering inlämnad'):
-                        value = self.ASSIGNMENT_STATUS_RESUBMITTED
+                if text in ('not yet submitted',
+                            'ej inlämnad'):
+                    value = self.ASSIGNMENT_STATUS_PENDING
 
-                    if text in ('completed', 'färdig'):
-                        value = self.ASSIGNMENT_STATUS_COMPLETED
+                if text in ('to be marked', 'ogranskad'):
+                    value = self.ASSIGNMENT_STATUS_MARKING
 
-                    fields['status'] = value
+                if text in ('revision required',
+                            'kompletteras'):
+                    value = self.ASSIGNMENT_STATUS_RESUBMIT
 
-                if label in ('submission deadline',
-                             'sista tidpunkt för inlämning'):
+                if text in ('revision submitted',
+                            'komplettering inlämnad'):
+                    value = self.ASSIGNMENT_STATUS_RESUBMITTED
 
-                    value = None
+                if text in ('completed', 'färdig'):
+                    value = self.ASSIGNMENT_STATUS_COMPLETED
 
-                    text = text.replace('maj', 'may')
-                    text = text.replace('okt', 'oct')
-                    if ',' in text:
-                        text = text.split(',')[0]
+                fields['status'] = value
 
-                    try:
-                        value = parse(text)
-                    except ValueError:
-                        match = re.findall('([^\s]*) ([0-9]+:[0-9]+)', text)
-                        if match:
-                            date, time = None, None
+            if label in ('submission deadline',
+                         'sista tidpunkt för inlämning'):
 
-                            date_text, time_text = match[0]
-                            date_text = date_text.lower().strip()
+                value = None
 
-                            now = datetime.now(timezone('Europe/Stockholm'))
+                text = text.replace('maj', 'may')
+                text = text.replace('okt', 'oct')
+                if ',' in text:
+                    text = text.split(',')[0]
 
-                            if date_text in ('today', 'idag'):
-                                date = now.date()
+                try:
+                    value = parse(text)
+                except ValueError:
+                    match = re.findall('([^\s]*) ([0-9]+:[0-9]+)', text)
+                    if match:
+                        date, time = None, None
 
-                            if date_text in ('yesterday', 'igår'):
-                                date = (now - timedelta(days=1)).date()
+                        date_text, time_text = match[0]
+                        date_text = date_text.lower().strip()
 
-                            time = parse(time_text).time()
+                        now = datetime.now(timezone(self.TIME_ZONE))
 
-                            value = datetime.combine(date, time)
+                        if date_text in ('today', 'idag'):
+                            date = now.date()
 
-                    fields['deadline'] = value
+                        if date_text in ('yesterday', 'igår'):
+                            date = (now - timedelta(days=1)).date()
 
-            data.append(fields)
+                        time = parse(time_text).time()
 
-        return data
+                        value = datetime.combine(date, time)
+
+                fields['deadline'] = value
+
+        return fields
@@ -1,10 +1,9 @@
 from urllib.parse import urljoin
-import functools
 
 import requests
-import bs4
 
-from gul.data.services.base import Service
+from gul.data.services.base import Service, cached
+from gul.data import soup
 
 
 class LadokService(Service):
@@ -13,11 +12,6 @@ class LadokService(Service):
     HOST = 'lpw.it.gu.se'
     BASE = 'http://{}/uPortal/Login'.format(HOST)
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-
-        self.courses = functools.lru_cache()(self.courses)
-
     def host(self):
         return self.HOST
 
@@ -28,6 +22,7 @@ class LadokService(Service):
     # SERVICE #
     ###########
 
+    @cached(ttl=30 * 60)
     def courses(self):
 
         response = self.session.get(
@@ -36,7 +31,7 @@ class LadokService(Service):
 
         assert response.status_code == requests.codes.ok
 
-        document = bs4.BeautifulSoup(response.text, 'html.parser')
+        document = soup.parse(response.text, class_='lpw-table')
 
         data = []
 
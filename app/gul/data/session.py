@@ -1,12 +1,18 @@
 from urllib.parse import urljoin, urlparse, parse_qs, urlencode
 import re
+import time
+import logging
+import contextlib
 
 import requests
-import bs4
 
+from gul.data import soup, transport
 from gul.data.utils import data_from_cookiejar, cookiejar_from_data
 
 
+logger = logging.getLogger(__name__)
+
+
 class Credentials(object):
     """Auth credentials."""
 
@@ -37,8 +43,31 @@ class Session(object):
 
     KEY = NotImplemented
 
+    BASE = NotImplemented
+
+    PATH_LOGIN = NotImplemented
+    PATH_LOGOUT = NotImplemented
+
     def __init__(self, session=None):
-        self.session = session or requests.Session()
+        self.session = session or transport.session()
+
+        # Durations of the steps of the last login
+        self.timings = []
+
+    @contextlib.contextmanager
+    def timed(self, step):
+        """Record the duration of a login step."""
+
+        start = time.monotonic()
+
+        try:
+            yield
+        finally:
+            duration = time.monotonic() - start
+            self.timings.append((step, duration))
+
+            logger.debug('%s login step %s took %.3fs',
+                         self.KEY, step, duration)
 
     ########
     # HTTP #
@@ -64,6 +93,12 @@ class Session(object):
 
         raise NotImplementedError()
 
+    def touch(self):
+        """Request the login page to keep the session alive."""
+
+        response = self.get(urljoin(self.BASE, self.PATH_LOGIN))
+        return response.status_code == requests.codes.ok
+
     ########
     # DATA #
     ########
@@ -86,7 +121,7 @@ class Session(object):
         cookies = cookiejar_from_data(data.get(cls.DATA_COOKIES))
         headers = data.get(cls.DATA_HEADERS)
 
-        session = requests.Session()
+        session = transport.session()
         session.cookies = cookies
         session.headers = headers
         return cls(session=session)
@@ -113,25 +148,25 @@ class CAS3Session(Session):
 
     def login(self, credentials):
 
-        url = urljoin(self.BASE, self.PATH_LOGIN)
+        self.timings = []
 
-        response = self.get(url)
-        assert response.status_code == requests.codes.ok
+        url = urljoin(self.BASE, self.PATH_LOGIN)
 
-        document = bs4.BeautifulSoup(response.text, 'html.parser')
-        form = document.find('form')
-        url = urljoin(response.url, form['action'])
+        with self.timed('form'):
+            response = self.get(url)
+            assert response.status_code == requests.codes.ok
 
-        data = {}
-        for field in form.select('input[name]'):
-            data[field['name']] = field['value']
+            action, data = soup.form(response.text)
+            url = urljoin(response.url, action)
 
         data.update(credentials.data())
 
-        response = self.post(url, data)
-        assert response.status_code == requests.codes.ok
+        with self.timed('credentials'):
+            response = self.post(url, data)
+            assert response.status_code == requests.codes.ok
 
-        document = bs4.BeautifulSoup(response.text, 'html.parser')
+        document = soup.parse(response.text,
+                              href='http://portalen.gu.se/student')
         return bool(document.select('[href="http://portalen.gu.se/student"]'))
 
     def logout(self):
@@ -141,7 +176,8 @@ class CAS3Session(Session):
         response = self.get(url)
         assert response.status_code == requests.codes.ok
 
-        document = bs4.BeautifulSoup(response.text, 'html.parser')
+        document = soup.parse(response.text,
+                              href='http://portalen.gu.se/student')
         return bool(document.select('[href="http://portalen.gu.se/student"]'))
 
 
@@ -154,63 +190,118 @@ class IDP3Session(Session):
     PATH_LOGIN = '/login/processlogin'
     PATH_LOGOUT = '/logout.do'
 
+    ENTITY_ID = 'https://idp3.it.gu.se/idp/shibboleth'
+
+    # Discovery service return URLs with the identity provider selected,
+    # keyed by deployment base URL
+    DISCOVERY = {}
+
+    # Query parameters of return URLs that are only valid for one login. The
+    # relay state is dropped from known return URLs, and the target replaced
+    # with the login page, which the service provider accepts as a target.
+    DISCOVERY_PER_REQUEST = ('target', 'RelayState')
+
     def login(self, credentials):
 
-        url = urljoin(self.BASE, self.PATH_LOGIN)
+        self.timings = []
 
-        response = self.get(url)
-        assert response.status_code == requests.codes.ok
+        # Skip the discovery service if its result is known, and follow the
+        # full flow if the known result does not lead to the login form
+        url = self.DISCOVERY.get(self.BASE)
+        found = self.discover(url) if url else None
 
-        if 'samlds' in response.url:
-            url = parse_qs(urlparse(response.url).query)['return'][0]
-            url = urlparse(url)
+        if found is None:
+            self.DISCOVERY.pop(self.BASE, None)
+            url = None
+            found = self.discover()
 
-            qs = {key: value[0] for key, value in parse_qs(url.query).items()}
-            qs['entityID'] = 'https://idp3.it.gu.se/idp/shibboleth'
-            qs = urlencode(qs)
+        assert found is not None
 
-            url = url._replace(query=qs).geturl()
+        response, action, data = found
+        action = urljoin(response.url, action)
 
-            response = self.get(url)
-            assert response.status_code == requests.codes.ok
+        data.update(credentials.data())
 
-        document = bs4.BeautifulSoup(response.text, 'html.parser')
+        with self.timed('credentials'):
+            response = self.post(action, data)
+            assert response.status_code == requests.codes.ok
 
-        idp = document.select('.idp')
-        idp = idp[0] if idp else None
-        if idp:
-            href = re.findall('location.href="(.*)"', idp['onclick'])[0]
+            action, data = soup.form(response.text)
 
-            response = self.get(href)
+        with self.timed('assertion'):
+            response = self.post(action, data)
             assert response.status_code == requests.codes.ok
 
-            document = bs4.BeautifulSoup(response.text, 'html.parser')
+        document = soup.parse(response.text, href='/logout.do')
+        success = bool(document.select('[href="/logout.do"]'))
 
-        form = document.find('form')
-        url = urljoin(response.url, form['action'])
+        # Credentials are not posted again, which would count twice against
+        # lockout, but the next login follows the full flow
+        if not success and url is not None:
+            self.DISCOVERY.pop(self.BASE, None)
 
-        data = {}
-        for field in form.select('input[name]'):
-            data[field['name']] = field['value']
+        return success
 
-        data.update(credentials.data())
+    def reusable(self, url):
+        """Get the return URL without the parameters of one login."""
 
-        response = self.post(url, data)
-        assert response.status_code == requests.codes.ok
+        url = urlparse(url)
 
-        document = bs4.BeautifulSoup(response.text, 'html.parser')
-        form = document.find('form')
-        url = form['action']
+        qs = {key: value[0] for key, value in parse_qs(url.query).items()
+              if key not in self.DISCOVERY_PER_REQUEST}
+        qs['target'] = urljoin(self.BASE, self.PATH_LOGIN)
 
-        data = {}
-        for field in form.select('input[name]'):
-            data[field['name']] = field['value']
+        return url._replace(query=urlencode(qs)).geturl()
 
-        response = self.post(url, data)
-        assert response.status_code == requests.codes.ok
+    def discover(self, url=None):
+        """Follow the login flow to the identity provider login form.
+
+        Starts at the discovery service return URL if specified, otherwise at
+        the login page. Returns the response with the login form and the form
+        action and fields, or `None` if there is no login form.
+        """
+
+        if url is None:
+            with self.timed('start'):
+                response = self.get(urljoin(self.BASE, self.PATH_LOGIN))
+                assert response.status_code == requests.codes.ok
+
+            if 'samlds' in response.url:
+                url = parse_qs(urlparse(response.url).query)['return'][0]
+                url = urlparse(url)
+
+                qs = {key: value[0]
+                      for key, value in parse_qs(url.query).items()}
+                qs['entityID'] = self.ENTITY_ID
+                qs = urlencode(qs)
+
+                url = url._replace(query=qs).geturl()
+
+        if url is not None:
+            with self.timed('discovery'):
+                response = self.get(url)
+                if response.status_code != requests.codes.ok:
+                    return None
+
+        document = soup.parse(response.text, class_='idp')
+
+        idp = document.select('.idp')
+        idp = idp[0] if idp else None
+        if idp:
+            href = re.findall('location.href="(.*)"', idp['onclick'])[0]
+
+            with self.timed('idp'):
+                response = self.get(href)
+                assert response.status_code == requests.codes.ok
+
+        action, data = soup.form(response.text)
+        if action is None:
+            return None
+
+        if url is not None:
+            self.DISCOVERY[self.BASE] = self.reusable(url)
 
-        document = bs4.BeautifulSoup(response.text, 'html.parser')
-        return bool(document.select('[href="/logout.do"]'))
+        return response, action, data
 
     def logout(self):
 
@@ -219,5 +310,5 @@ class IDP3Session(Session):
         response = self.get(url)
         assert response.status_code == requests.codes.ok
 
-        document = bs4.BeautifulSoup(response.text, 'html.parser')
+        document = soup.parse(response.text, class_='cas-logout')
         return bool(document.select('.cas-logout'))
@@ -0,0 +1,301 @@
+import pytz
+from django.db import transaction
+from django.utils import timezone
+
+from utils import concurrency
+from gul.data.grades import GradeStore
+from gul.data.services import GulService
+from gul.models import Course, Membership, Assignment, Grade, SnapshotSync
+
+
+class Snapshot(object):
+    """Persisted snapshot of data scraped from a service.
+
+    Fresh snapshots are read from the database. Stale snapshots are read too,
+    while they are refreshed in the background. Missing and expired snapshots
+    are scraped and stored before returning the scraped data. The time of the
+    last sync is stored per snapshot, so that empty snapshots are kept too.
+    """
+
+    model = NotImplemented
+
+    # Fields updated when a stored row is scraped again
+    UPDATE = NotImplemented
+
+    # Seconds a snapshot is read without refreshing it
+    FRESH = 5 * 60
+
+    # Seconds a stale snapshot is read while it is refreshed
+    STALE = 24 * 60 * 60
+
+    def __init__(self, identity, service, *args):
+        self.identity = identity
+        self.service = service
+        self.args = args
+
+    def scrape(self):
+        """Get fresh data from the service, replacing its cached result, so
+        that the sync time is the time the data was scraped."""
+        raise NotImplementedError()
+
+    def rows(self, data, now):
+        """Get model instances of scraped data."""
+        raise NotImplementedError()
+
+    def serialize(self, row):
+        """Get data of a stored row, as scraped from the service."""
+        raise NotImplementedError()
+
+    def queryset(self):
+        """Get stored rows of the snapshot, in scraped order."""
+        raise NotImplementedError()
+
+    def key(self):
+        return (type(self).__name__, self.identity.pk) + self.args
+
+    def owner(self):
+        """Get the identity whose removal removes the snapshot."""
+        return self.identity
+
+    def get_sync_key(self):
+        return ':'.join(str(part) for part in self.key())
+
+    def get(self, fresh=None, stale=None):
+        """Get data, from the snapshot if it is at most `stale` seconds old.
+
+        Snapshots older than `fresh` seconds are refreshed in the
+        background.
+        """
+
+        fresh = self.FRESH if fresh is None else fresh
+        stale = self.STALE if stale is None else stale
+
+        synced_at = SnapshotSync.objects.filter(
+            key=self.get_sync_key(),
+        ).values_list('synced_at', flat=True).first()
+
+        if synced_at is None:
+            return self.sync()
+
+        age = (timezone.now() - synced_at).total_seconds()
+
+        if age > max(fresh, stale):
+            return self.sync()
+
+        if age > fresh:
+            self.refresh()
+
+        return [self.serialize(row) for row in self.queryset()]
+
+    def refresh(self):
+        """Synchronize the snapshot in the background."""
+        concurrency.spawn_once(self.get_sync_key(), self.sync)
+
+    def sync(self):
+        """Scrape data and store it as the snapshot. Returns the data."""
+
+        data = self.scrape()
+        now = timezone.now()
+
+        with transaction.atomic():
+            self.model.bulk_load(self.rows(data, now), update=self.UPDATE)
+            self.queryset().filter(synced_at__lt=now).delete()
+            self.synced(now)
+
+        return data
+
+    def synced(self, now):
+        """Store the time of the last sync."""
+
+        SnapshotSync(
+            identity=self.owner(),
+            key=self.get_sync_key(),
+            synced_at=now,
+        ).upsert(update=('synced_at',))
+
+
+class CourseSnapshot(Snapshot):
+    """Snapshot of the GUL courses of an identity."""
+
+    model = Course
+
+    UPDATE = ('name', 'category', 'active', 'url', 'position', 'synced_at')
+
+    def scrape(self):
+        return self.service.fetch('courses')
+
+    def rows(self, data, now):
+        for position, course in enumerate(data):
+            yield Course(
+                identity=self.identity,
+                course_id=course['id'],
+                name=course['name'],
+                category=course['category'],
+                active=course['active'],
+                url=course['url'],
+                position=position,
+                synced_at=now,
+            )
+
+    def serialize(self, row):
+        return {
+            'id': row.course_id,
+            'name': row.name,
+            'category': row.category,
+            'active': row.active,
+            'url': row.url,
+        }
+
+    def queryset(self):
+        return Course.objects.filter(
+            identity=self.identity,
+        ).order_by('position')
+
+
+class MembershipSnapshot(Snapshot):
+    """Snapshot of the members of a type in a GUL course.
+
+    Members are stored once per course, and only read for identities with
+    the course in their course snapshot.
+    """
+
+    model = Membership
+
+    UPDATE = ('name', 'position', 'synced_at')
+
+    def __init__(self, identity, service, course_id, member_type):
+        super().__init__(identity, service, int(course_id), member_type)
+
+        self.course_id, self.member_type = self.args
+
+    def get(self, fresh=None, stale=None):
+
+        # Let the service check access to courses missing from the snapshot
+        if not Course.objects.filter(identity=self.identity,
+                                     course_id=self.course_id).exists():
+            return self.service.members(self.course_id, self.member_type)
+
+        return super().get(fresh=fresh, stale=stale)
+
+    def key(self):
+        return (type(self).__name__,) + self.args
+
+    def owner(self):
+        return None
+
+    def scrape(self):
+        return self.service.fetch('members', self.course_id,
+                                  self.member_type)
+
+    def rows(self, data, now):
+        for position, member in enumerate(data):
+            yield Membership(
+                course_id=self.course_id,
+                type=self.member_type,
+                alias=member['alias'],
+                name=member['name'],
+                position=position,
+                synced_at=now,
+            )
+
+    def serialize(self, row):
+        return {
+            'name': row.name,
+            'alias': row.alias,
+            'type': row.type,
+        }
+
+    def queryset(self):
+        return Membership.objects.filter(
+            course_id=self.course_id,
+            type=self.member_type,
+        ).order_by('position')
+
+
+class AssignmentSnapshot(Snapshot):
+    """Snapshot of the assignments of an identity in a GUL course.
+
+    Deadlines are scraped without time zone, they are stored in the time
+    zone of GUL and read back without it.
+    """
+
+    model = Assignment
+
+    TIME_ZONE = pytz.timezone(GulService.TIME_ZONE)
+
+    UPDATE = ('name', 'group', 'url', 'status', 'deadline', 'position',
+              'synced_at')
+
+    def __init__(self, identity, service, course_id):
+        super().__init__(identity, service, int(course_id))
+
+        self.course_id, = self.args
+
+    def scrape(self):
+        return self.service.fetch('assignments', self.course_id)
+
+    def rows(self, data, now):
+        for position, assignment in enumerate(data):
+            yield Assignment(
+                identity=self.identity,
+                course_id=self.course_id,
+                assignment_id=assignment['id'],
+                name=assignment['name'],
+                group=assignment['group'],
+                url=assignment['url'],
+                status=assignment.get('status'),
+                deadline=self.localize(assignment.get('deadline')),
+                position=position,
+                synced_at=now,
+            )
+
+    def serialize(self, row):
+        return {
+            'id': row.assignment_id,
+            'name': row.name,
+            'group': row.group,
+            'url': row.url,
+            'status': row.status,
+            'deadline': row.deadline and timezone.make_naive(
+                row.deadline, self.TIME_ZONE),
+        }
+
+    def localize(self, deadline):
+        if deadline is None or timezone.is_aware(deadline):
+            return deadline
+
+        # Ambiguous times at the end of daylight saving time are read as
+        # standard time
+        return timezone.make_aware(deadline, self.TIME_ZONE, is_dst=False)
+
+    def queryset(self):
+        return Assignment.objects.filter(
+            identity=self.identity,
+            course_id=self.course_id,
+        ).order_by('position')
+
+
+class GradeSnapshot(Snapshot):
+    """Snapshot of the Ladok results of an identity, shared with the grade
+    store of the chat bot."""
+
+    model = Grade
+
+    def get_sync_key(self):
+        return GradeStore(self.identity, self.service).get_sync_key()
+
+    def sync(self):
+        return GradeStore(self.identity, self.service).sync()
+
+    def serialize(self, row):
+        return {
+            'code': row.code,
+            'name': row.name,
+            'credits': row.credits,
+            'grade': row.grade,
+        }
+
+    def queryset(self):
+        return Grade.objects.filter(
+            identity=self.identity,
+        ).order_by('code')
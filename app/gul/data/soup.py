@@ -0,0 +1,68 @@
+import re
+from html.parser import HTMLParser
+
+import bs4
+
+try:
+    import lxml  # noqa
+except ImportError:
+    PARSER = 'html.parser'
+else:
+    PARSER = 'lxml'
+
+
+def parse(text, *args, parser=None, **kwargs):
+    """Parse an HTML document.
+
+    Any other arguments define a `bs4.SoupStrainer` that restricts parsing
+    to the matching elements and their descendants, so selectors that start
+    at a matched element give the same result as on the full document.
+
+    document = parse(response.text, id='myCourses')
+    rows = document.select('#myCourses .data-row')
+    """
+
+    strainer = bs4.SoupStrainer(*args, **kwargs) if args or kwargs else None
+
+    return bs4.BeautifulSoup(text, parser or PARSER, parse_only=strainer)
+
+
+class FormScanner(HTMLParser):
+    """Scanner for the action and named fields of the first form."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+
+        self.action = None
+        self.fields = {}
+        self.inside = False
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+
+        if tag == 'form' and self.action is None:
+            self.action = attrs.get('action') or ''
+            self.inside = True
+
+        if tag == 'input' and self.inside and 'name' in attrs:
+            self.fields[attrs['name']] = attrs.get('value') or ''
+
+    def handle_endtag(self, tag):
+        if tag == 'form':
+            self.inside = False
+
+
+def form(text):
+    """Get the action and named fields of the first form in an HTML document.
+
+    Only the document up to the end of the first form is scanned, without
+    building a tree. The action is `None` if there is no form.
+    """
+
+    end = re.search('</form\\s*>', text, re.IGNORECASE)
+
+    scanner = FormScanner()
+    scanner.feed(text[:end.end()] if end else text)
+    scanner.close()
+
+    return scanner.action, scanner.fields
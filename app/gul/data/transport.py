@@ -0,0 +1,69 @@
+import threading
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.util.retry import Retry
+
+
+# Number of upstream hosts to keep connection pools for
+POOL_HOSTS = 10
+
+# Number of connections kept alive per upstream host
+POOL_SIZE = 20
+
+# Maximum number of requests in flight per upstream host, across all
+# sessions and threads of the process
+HOST_CONCURRENCY = 8
+
+
+class SharedHTTPAdapter(HTTPAdapter):
+    """HTTP adapter whose connection pools outlive the sessions using it.
+
+    Requests wait for a free slot of their host, so nested thread pools of
+    services never send more than `host_concurrency` requests to one host.
+    """
+
+    def __init__(self, host_concurrency=HOST_CONCURRENCY, **kwargs):
+        super().__init__(**kwargs)
+
+        self.host_concurrency = host_concurrency
+        self.hosts = {}
+        self.hosts_lock = threading.Lock()
+
+    def limit(self, url):
+        """Get the semaphore limiting requests to the host of url."""
+
+        host = urlparse(url).hostname
+
+        with self.hosts_lock:
+            semaphore = self.hosts.get(host)
+            if semaphore is None:
+                semaphore = threading.BoundedSemaphore(self.host_concurrency)
+                self.hosts[host] = semaphore
+
+        return semaphore
+
+    def send(self, request, **kwargs):
+        with self.limit(request.url):
+            return super().send(request, **kwargs)
+
+    def close(self):
+        pass
+
+
+adapter = SharedHTTPAdapter(
+    pool_connections=POOL_HOSTS,
+    pool_maxsize=POOL_SIZE,
+    max_retries=Retry(total=3, backoff_factor=0.1),
+)
+
+
+def session():
+    """Create a session with its own cookies and headers, sending requests
+    through the process-wide connection pool."""
+
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
@@ -0,0 +1,157 @@
+import time
+import logging
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from utils import concurrency
+from gul.data.session import Session
+from gul.views.api.identity import IdentityMixin
+from gul.models import Identity, Authorization
+
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """Keep stored sessions alive and reauthorize expired services.
+
+    Rows are only written while the identity keeps the token it had when
+    read, so that a new login is never overwritten. Web processes see the
+    writes once their hydrated services expire, see `identity.SERVICE_TTL`.
+    """
+
+    help = 'Keep stored sessions alive and reauthorize expired services.'
+
+    STATUS_ALIVE = 'alive'
+    STATUS_RENEWED = 'renewed'
+    STATUS_EXPIRED = 'expired'
+    STATUS_SKIPPED = 'skipped'
+    STATUS_FAILED = 'failed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=int, default=0,
+                            help='Repeat every INTERVAL seconds.')
+        parser.add_argument('--workers', type=int, default=8,
+                            help='Number of sessions refreshed concurrently.')
+
+    def handle(self, *args, **options):
+        while True:
+            self.touch_identities(options['workers'])
+            self.refresh_authorizations(options['workers'])
+
+            if not options['interval']:
+                break
+
+            time.sleep(options['interval'])
+
+    def touch_identities(self, workers):
+        """Touch identity sessions and store their updated cookies."""
+
+        identities = list(Identity.objects.filter(token__isnull=False))
+
+        def touch(identity):
+            try:
+                sessions = [session_class.from_data(identity.session)
+                            for session_class in IdentityMixin.SESSION_CLASS]
+
+                for session in sessions:
+                    session.touch()
+            except Exception:
+                logger.exception('Failed to touch identity %s', identity.pk)
+                return identity, None
+
+            return identity, Session.all_to_data(*sessions)
+
+        results = concurrency.map(touch, identities, workers=workers)
+
+        with transaction.atomic():
+            for identity, data in results:
+                if data is not None:
+                    Identity.objects.filter(
+                        pk=identity.pk,
+                        token=identity.token,
+                    ).update(session=data)
+
+        self.stdout.write('Touched {} identities.'.format(len(results)))
+
+    def refresh_authorizations(self, workers):
+        """Touch service sessions, reauthorizing those that expired."""
+
+        classes = {
+            service_class.NAME: (session_class, service_class)
+            for session_class, service_class in IdentityMixin.SERVICE_CLASS
+        }
+
+        authorizations = list(
+            Authorization.objects
+            .select_related('identity')
+            .filter(identity__token__isnull=False,
+                    service__in=list(classes))
+        )
+
+        def refresh(authorization):
+            try:
+                return check(authorization)
+            except Exception:
+                logger.exception('Failed to refresh authorization %s',
+                                 authorization.pk)
+                return self.STATUS_FAILED, authorization, None
+
+        def check(authorization):
+            session_class, service_class = classes[authorization.service]
+
+            service = service_class(
+                session=session_class.from_data(authorization.session),
+                identity=authorization.identity.alias,
+            )
+
+            if service.valid():
+                return (self.STATUS_ALIVE, authorization,
+                        service.session.to_data())
+
+            # Logging in again replaced the token and the authorizations
+            if not Identity.objects.filter(
+                    pk=authorization.identity.pk,
+                    token=authorization.identity.token).exists():
+                return self.STATUS_SKIPPED, authorization, None
+
+            # Login without storing the authorization, which is written
+            # below only if the token is unchanged
+            service = service_class(identity=authorization.identity.alias)
+            if not service.login(
+                    session_class.from_data(authorization.identity.session)):
+                return self.STATUS_EXPIRED, authorization, None
+
+            return (self.STATUS_RENEWED, authorization,
+                    service.session.to_data())
+
+        results = concurrency.map(refresh, authorizations, workers=workers)
+
+        with transaction.atomic():
+            for status, authorization, data in results:
+                if status in (self.STATUS_ALIVE, self.STATUS_RENEWED):
+                    Authorization.objects.filter(
+                        pk=authorization.pk,
+                        identity__token=authorization.identity.token,
+                    ).update(session=data)
+
+                elif status == self.STATUS_EXPIRED:
+                    Authorization.objects.filter(
+                        pk=authorization.pk,
+                        identity__token=authorization.identity.token,
+                    ).delete()
+
+        counts = {
+            status: len([result for result in results if result[0] == status])
+            for status in (self.STATUS_ALIVE,
+                           self.STATUS_RENEWED,
+                           self.STATUS_EXPIRED,
+                           self.STATUS_SKIPPED,
+                           self.STATUS_FAILED)
+        }
+
+        self.stdout.write(
+            'Refreshed {} authorizations ({alive} alive, {renewed} renewed, '
+            '{expired} expired, {skipped} skipped, {failed} failed).'.format(
+                len(results), **counts))
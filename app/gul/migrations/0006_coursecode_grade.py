@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.1 on 2016-11-20 14:12
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+import utils.sql
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gul', '0005_room'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseCode',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('course_id', models.IntegerField(unique=True, verbose_name='course ID')),
+                ('code', models.CharField(max_length=20, verbose_name='code')),
+            ],
+            options={
+                'verbose_name': 'course code',
+                'verbose_name_plural': 'course codes',
+            },
+            bases=(models.Model, utils.sql.StandardIINEModelMixin),
+        ),
+        migrations.CreateModel(
+            name='Grade',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(max_length=20, verbose_name='code')),
+                ('name', models.CharField(max_length=200, verbose_name='name')),
+                ('credits', models.FloatField(verbose_name='credits')),
+                ('grade', models.CharField(blank=True, max_length=20, verbose_name='grade')),
+                ('synced_at', models.DateTimeField(verbose_name='synced at')),
+                ('identity', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='grades', to='gul.Identity', verbose_name='identity')),
+            ],
+            options={
+                'verbose_name': 'grade',
+                'verbose_name_plural': 'grades',
+            },
+            bases=(models.Model, utils.sql.StandardIINEModelMixin),
+        ),
+        migrations.AlterUniqueTogether(
+            name='grade',
+            unique_together=set([('identity', 'code')]),
+        ),
+    ]
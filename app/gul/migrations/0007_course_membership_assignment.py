@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.1 on 2016-11-27 16:40
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+import utils.sql
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gul', '0006_coursecode_grade'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Assignment',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('course_id', models.IntegerField(verbose_name='course ID')),
+                ('assignment_id', models.IntegerField(verbose_name='assignment ID')),
+                ('name', models.CharField(max_length=200, verbose_name='name')),
+                ('group', models.CharField(blank=True, max_length=200, null=True, verbose_name='group')),
+                ('url', models.CharField(max_length=500, verbose_name='URL')),
+                ('status', models.CharField(blank=True, max_length=20, null=True, verbose_name='status')),
+                ('deadline', models.DateTimeField(blank=True, null=True, verbose_name='deadline')),
+                ('position', models.IntegerField(verbose_name='position')),
+                ('synced_at', models.DateTimeField(verbose_name='synced at')),
+                ('identity', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='assignments', to='gul.Identity', verbose_name='identity')),
+            ],
+            options={
+                'verbose_name': 'assignment',
+                'verbose_name_plural': 'assignments',
+            },
+            bases=(models.Model, utils.sql.StandardIINEModelMixin),
+        ),
+        migrations.CreateModel(
+            name='Course',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('course_id', models.IntegerField(verbose_name='course ID')),
+                ('name', models.CharField(max_length=200, verbose_name='name')),
+                ('category', models.CharField(max_length=100, verbose_name='category')),
+                ('active', models.BooleanField(verbose_name='active')),
+                ('url', models.CharField(max_length=500, verbose_name='URL')),
+                ('position', models.IntegerField(verbose_name='position')),
+                ('synced_at', models.DateTimeField(verbose_name='synced at')),
+                ('identity', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='courses', to='gul.Identity', verbose_name='identity')),
+            ],
+            options={
+                'verbose_name': 'course',
+                'verbose_name_plural': 'courses',
+            },
+            bases=(models.Model, utils.sql.StandardIINEModelMixin),
+        ),
+        migrations.CreateModel(
+            name='Membership',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('course_id', models.IntegerField(verbose_name='course ID')),
+                ('type', models.CharField(max_length=20, verbose_name='type')),
+                ('alias', models.CharField(max_length=100, verbose_name='alias')),
+                ('name', models.CharField(max_length=200, verbose_name='name')),
+                ('position', models.IntegerField(verbose_name='position')),
+                ('synced_at', models.DateTimeField(verbose_name='synced at')),
+            ],
+            options={
+                'verbose_name': 'membership',
+                'verbose_name_plural': 'memberships',
+            },
+            bases=(models.Model, utils.sql.StandardIINEModelMixin),
+        ),
+        migrations.AlterUniqueTogether(
+            name='membership',
+            unique_together=set([('course_id', 'type', 'alias')]),
+        ),
+        migrations.AlterUniqueTogether(
+            name='course',
+            unique_together=set([('identity', 'course_id')]),
+        ),
+        migrations.AlterUniqueTogether(
+            name='assignment',
+            unique_together=set([('identity', 'course_id', 'assignment_id')]),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.1 on 2016-11-28 10:12
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+import utils.sql
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gul', '0007_course_membership_assignment'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SnapshotSync',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=200, unique=True, verbose_name='key')),
+                ('synced_at', models.DateTimeField(verbose_name='synced at')),
+                ('identity', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='snapshot_syncs', to='gul.Identity', verbose_name='identity')),
+            ],
+            options={
+                'verbose_name': 'snapshot sync',
+                'verbose_name_plural': 'snapshot syncs',
+            },
+            bases=(models.Model, utils.sql.StandardIINEModelMixin),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.1 on 2016-11-28 14:37
+from __future__ import unicode_literals
+
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations, models
+import utils.sql
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gul', '0008_snapshotsync'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.CharField(max_length=32, primary_key=True, serialize=False, verbose_name='ID')),
+                ('owner', models.CharField(max_length=100, verbose_name='owner')),
+                ('parts', django.contrib.postgres.fields.jsonb.JSONField(default=list, verbose_name='parts')),
+                ('done', models.BooleanField(default=False, verbose_name='done')),
+                ('error', models.TextField(blank=True, null=True, verbose_name='error')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='created at')),
+            ],
+            options={
+                'verbose_name': 'job',
+                'verbose_name_plural': 'jobs',
+            },
+            bases=(models.Model, utils.sql.StandardIINEModelMixin),
+        ),
+    ]
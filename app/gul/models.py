@@ -49,3 +49,125 @@ class Room(models.Model, sql.StandardIINEModelMixin):
     class Meta:
         verbose_name = _('room')
         verbose_name_plural = _('rooms')
+
+
+class CourseCode(models.Model, sql.StandardIINEModelMixin):
+
+    RELATED_NAME = 'course_codes'
+
+    course_id = models.IntegerField(_('course ID'), unique=True)
+    code = models.CharField(_('code'), max_length=20)
+
+    class Meta:
+        verbose_name = _('course code')
+        verbose_name_plural = _('course codes')
+
+
+class Grade(models.Model, sql.StandardIINEModelMixin):
+
+    RELATED_NAME = 'grades'
+
+    identity = models.ForeignKey(Identity, verbose_name=_('identity'),
+                                 related_name=RELATED_NAME)
+    code = models.CharField(_('code'), max_length=20)
+    name = models.CharField(_('name'), max_length=200)
+    credits = models.FloatField(_('credits'))
+    grade = models.CharField(_('grade'), max_length=20, blank=True)
+    synced_at = models.DateTimeField(_('synced at'))
+
+    class Meta:
+        unique_together = (('identity', 'code'),)
+        verbose_name = _('grade')
+        verbose_name_plural = _('grades')
+
+
+class Course(models.Model, sql.StandardIINEModelMixin):
+
+    RELATED_NAME = 'courses'
+
+    identity = models.ForeignKey(Identity, verbose_name=_('identity'),
+                                 related_name=RELATED_NAME)
+    course_id = models.IntegerField(_('course ID'))
+    name = models.CharField(_('name'), max_length=200)
+    category = models.CharField(_('category'), max_length=100)
+    active = models.BooleanField(_('active'))
+    url = models.CharField(_('URL'), max_length=500)
+    position = models.IntegerField(_('position'))
+    synced_at = models.DateTimeField(_('synced at'))
+
+    class Meta:
+        unique_together = (('identity', 'course_id'),)
+        verbose_name = _('course')
+        verbose_name_plural = _('courses')
+
+
+class Membership(models.Model, sql.StandardIINEModelMixin):
+
+    RELATED_NAME = 'memberships'
+
+    course_id = models.IntegerField(_('course ID'))
+    type = models.CharField(_('type'), max_length=20)
+    alias = models.CharField(_('alias'), max_length=100)
+    name = models.CharField(_('name'), max_length=200)
+    position = models.IntegerField(_('position'))
+    synced_at = models.DateTimeField(_('synced at'))
+
+    class Meta:
+        unique_together = (('course_id', 'type', 'alias'),)
+        verbose_name = _('membership')
+        verbose_name_plural = _('memberships')
+
+
+class Assignment(models.Model, sql.StandardIINEModelMixin):
+
+    RELATED_NAME = 'assignments'
+
+    identity = models.ForeignKey(Identity, verbose_name=_('identity'),
+                                 related_name=RELATED_NAME)
+    course_id = models.IntegerField(_('course ID'))
+    assignment_id = models.IntegerField(_('assignment ID'))
+    name = models.CharField(_('name'), max_length=200)
+    group = models.CharField(_('group'), max_length=200,
+                             null=True, blank=True)
+    url = models.CharField(_('URL'), max_length=500)
+    status = models.CharField(_('status'), max_length=20,
+                              null=True, blank=True)
+    deadline = models.DateTimeField(_('deadline'), null=True, blank=True)
+    position = models.IntegerField(_('position'))
+    synced_at = models.DateTimeField(_('synced at'))
+
+    class Meta:
+        unique_together = (('identity', 'course_id', 'assignment_id'),)
+        verbose_name = _('assignment')
+        verbose_name_plural = _('assignments')
+
+
+class SnapshotSync(models.Model, sql.StandardIINEModelMixin):
+
+    RELATED_NAME = 'snapshot_syncs'
+
+    identity = models.ForeignKey(Identity, verbose_name=_('identity'),
+                                 related_name=RELATED_NAME,
+                                 null=True, blank=True)
+    key = models.CharField(_('key'), max_length=200, unique=True)
+    synced_at = models.DateTimeField(_('synced at'))
+
+    class Meta:
+        verbose_name = _('snapshot sync')
+        verbose_name_plural = _('snapshot syncs')
+
+
+class Job(models.Model, sql.StandardIINEModelMixin):
+
+    RELATED_NAME = 'jobs'
+
+    id = models.CharField(_('ID'), max_length=32, primary_key=True)
+    owner = models.CharField(_('owner'), max_length=100)
+    parts = JSONField(_('parts'), default=list)
+    done = models.BooleanField(_('done'), default=False)
+    error = models.TextField(_('error'), null=True, blank=True)
+    created_at = models.DateTimeField(_('created at'), auto_now_add=True)
+
+    class Meta:
+        verbose_name = _('job')
+        verbose_name_plural = _('jobs')
@@ -1,15 +1,28 @@
+import logging
+import threading
+
+from django.core.exceptions import PermissionDenied
 from django.utils.functional import SimpleLazyObject
 from django.utils.html import escape
 
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework import serializers
+from rest_framework import serializers, status
+from rest_framework.exceptions import (
+    APIException, ValidationError, NotFound,
+)
 
+from utils import concurrency
 from gul.data.session import IDP3Session, CAS3Session
 from gul.data.services import GulService, LadokService
 from gul.data.bot import Command, handler
+from gul.data import jobs
+from gul.data.grades import GradeStore
+from gul.data.rooms import directory
 from gul.views.api import identity
-from gul.models import Room
+
+
+logger = logging.getLogger(__name__)
 
 
 class BaseView(identity.SessionMixin, APIView):
@@ -19,54 +32,188 @@ class BaseView(identity.SessionMixin, APIView):
     def perform_authentication(self, request):
         super().perform_authentication(request)
 
+        self.services = {}
+        self.services_lock = threading.Lock()
+
         self.gul = SimpleLazyObject(lambda: (
-            identity.ServiceMixin.get_service(self,
-                                              session_class=IDP3Session,
-                                              service_class=GulService)
+            self.get_service(session_class=IDP3Session,
+                             service_class=GulService)
         ))
 
         self.ladok = SimpleLazyObject(lambda: (
-            identity.ServiceMixin.get_service(self,
-                                              session_class=CAS3Session,
-                                              service_class=LadokService)
+            self.get_service(session_class=CAS3Session,
+                             service_class=LadokService)
         ))
 
+    def get_service(self, session_class, service_class):
+        """Get service once, even when messages are handled concurrently."""
+
+        with self.services_lock:
+            if service_class.NAME not in self.services:
+                self.services[service_class.NAME] = (
+                    identity.ServiceMixin.get_service(
+                        self,
+                        session_class=session_class,
+                        service_class=service_class,
+                    )
+                )
+
+            return self.services[service_class.NAME]
+
 
 class HandleView(BaseView):
+    """Handle a message, or a list of messages in one request."""
+
+    # Maximum number of messages in one request
+    MESSAGES = 50
+
+    # Number of messages handled concurrently
+    WORKERS = 4
+
+    # Errors of messages in a list, for unexpected exceptions
+    ERROR = 'Could not handle message.'
+    ERROR_PERMISSION = 'Permission denied.'
 
     class Serializer(serializers.Serializer):
         text = serializers.CharField(required=True)
         room_id = serializers.UUIDField(required=False)
+        background = serializers.BooleanField(required=False)
 
     def post(self, request):
+        if 'messages' in request.data:
+            return self.post_messages(request)
+
         serializer = self.Serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
         text = serializer.validated_data.get('text')
         room_id = serializer.validated_data.get('room_id')
 
-        if room_id:
-            try:
-                room = Room.objects.get(room_id=room_id)
-            except Room.DoesNotExist:
-                room = None
-        else:
-            room = None
+        room = directory.get(room_id) if room_id else None
+
+        # Handle slow commands in a background job
+        if serializer.validated_data.get('background'):
+            message = self.request_message(text.lower(), room=room)
+
+            if handler.slow(message):
+                if not self.identity:
+                    raise PermissionDenied()
+
+                job = jobs.start(self.identity.alias, self.handle_job,
+                                 message)
+
+                return Response({
+                    'job': job.id,
+                }, status=status.HTTP_202_ACCEPTED)
+
+        response = self.handle(text.lower(), room=room)
+
+        return Response(self.render(response))
+
+    def post_messages(self, request):
+        if not self.identity:
+            raise PermissionDenied()
+
+        serializer = self.Serializer(data=request.data['messages'],
+                                     many=True)
+        serializer.is_valid(raise_exception=True)
+
+        messages = serializer.validated_data
+
+        if len(messages) > self.MESSAGES:
+            raise ValidationError({
+                'messages': 'At most {} messages allowed.'.format(
+                    self.MESSAGES),
+            })
+
+        rooms = directory.get_many([
+            message['room_id'] for message in messages
+            if message.get('room_id')
+        ])
 
-        text = self.handle(text.lower(), room=room)
+        def handle(message):
+            try:
+                response = self.handle(message['text'].lower(),
+                                       room=rooms.get(message.get('room_id')))
+            except PermissionDenied:
+                return {'error': self.ERROR_PERMISSION}
+            except APIException as error:
+                return {'error': str(error.detail)}
+            except Exception:
+                logger.exception('Failed to handle message')
+                return {'error': self.ERROR}
+
+            return self.render(response)
 
         return Response({
-            'text': escape(text).replace('\n', '<br/>'),
+            'messages': concurrency.map(handle, messages,
+                                        workers=self.WORKERS),
         })
 
-    def handle(self, text, room=None):
-        request = Command.Request(text, room=room)
+    def render(self, response):
+        return {
+            'text': escape(response.text).replace('\n', '<br/>'),
+            'rule': response.rule,
+        }
+
+    def request_message(self, text, room=None):
+        request = Command.Request(
+            text, room=room,
+            identity=self.identity.alias if self.identity else None,
+        )
         request.use(
             gul=self.gul,
             ladok=self.ladok,
+            grades=GradeStore(self.identity, self.ladok)
+            if self.identity else None,
         )
-        response = handler.handle(request)
-        return response.text
+        return request
+
+    def handle(self, text, room=None):
+        return handler.handle(self.request_message(text, room=room))
+
+    def handle_job(self, job, request):
+        for response in handler.stream(request):
+            job.append(self.render(response))
+
+
+class JobView(BaseView):
+    """Poll the parts of a background chat job.
+
+    Waits up to `wait` seconds for parts after index `after`.
+    """
+
+    # Maximum number of seconds to wait for parts
+    WAIT = 20
+
+    class Serializer(serializers.Serializer):
+        after = serializers.IntegerField(required=False, default=0,
+                                         min_value=0)
+        wait = serializers.FloatField(required=False, default=0,
+                                      min_value=0)
+
+    def get(self, request, job_id):
+        if not self.identity:
+            raise PermissionDenied()
+
+        serializer = self.Serializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+
+        after = serializer.validated_data['after']
+        wait = min(serializer.validated_data['wait'], self.WAIT)
+
+        job = jobs.get(job_id, owner=self.identity.alias)
+        if job is None:
+            raise NotFound()
+
+        parts, done = job.wait(after=after, timeout=wait)
+
+        return Response({
+            'parts': parts,
+            'next': after + len(parts),
+            'done': done,
+            'error': job.error,
+        })
 
 
 class RoomsView(BaseView):
@@ -77,18 +224,10 @@ class RoomsView(BaseView):
     def get(self, request):
         courses = self.gul.courses()
 
-        Room.insert_if_not_exist([
-            Room(
-                course_id=course.get('id'),
-                course_name=course.get('name'),
-            )
-            for course in courses
-        ])
+        rooms = directory.sync(courses)
 
         return Response([{
             'id': str(room.room_id),
             'name': '{} ({})'.format(room.course_name,
                                      room.course_id),
-        } for room in Room.objects.filter(
-            course_id__in=[course.get('id') for course in courses]
-        )])
+        } for room in rooms])
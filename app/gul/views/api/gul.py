@@ -1,46 +1,141 @@
+import json
+
+from django.http import StreamingHttpResponse
+
 from rest_framework.views import APIView
 from rest_framework.response import Response
+from rest_framework import serializers
 
 from gul.data.session import IDP3Session
 from gul.data.services import GulService
+from gul.data.index import MemberIndex
+from gul.data.snapshots import (
+    CourseSnapshot, MembershipSnapshot, AssignmentSnapshot,
+)
 from gul.views.api import identity
 
 
-class CoursesView(identity.ServiceMixin, APIView):
+class CoursesView(identity.SnapshotMixin, APIView):
 
     session_class = IDP3Session
     service_class = GulService
+    snapshot_class = CourseSnapshot
 
     def get(self, request):
-        return Response(self.service.courses())
+        data = self.snapshot()
+        if data is None:
+            data = self.service.courses()
+
+        return Response(data)
+
+
+def stream_json(items):
+    """Stream a JSON list of items as they are produced."""
+
+    yield '['
+
+    for index, item in enumerate(items):
+        yield (',' if index else '') + json.dumps(item)
+
+    yield ']'
+
+
+class MembersView(identity.SnapshotMixin, APIView):
+    """List members of a course.
+
+    With the `stream` query parameter the list is streamed while pages of
+    members are being fetched.
+    """
+
+    session_class = IDP3Session
+    service_class = GulService
+    snapshot_class = MembershipSnapshot
+
+    member_type = NotImplemented
+
+    def get(self, request, course_id):
+        course_id = int(course_id)
 
+        if 'stream' in request.query_params:
+            return StreamingHttpResponse(
+                stream_json(self.service.iter_members(course_id,
+                                                      self.member_type)),
+                content_type='application/json',
+            )
 
-class StudentsView(identity.ServiceMixin, APIView):
+        data = self.snapshot(course_id, self.member_type)
+        if data is None:
+            data = self.service.members(course_id, self.member_type)
+
+        return Response(data)
+
+
+class StudentsView(MembersView):
+
+    member_type = GulService.MEMBER_TYPE_STUDENT
+
+
+class SupervisorsView(MembersView):
+
+    member_type = GulService.MEMBER_TYPE_SUPERVISOR
+
+
+class RosterView(identity.ServiceMixin, APIView):
+    """List students and supervisors of a course."""
 
     session_class = IDP3Session
     service_class = GulService
 
     def get(self, request, course_id):
-        return Response(
-            self.service.members(course_id,
-                                 GulService.MEMBER_TYPE_STUDENT))
+        return Response(self.service.roster(int(course_id)))
 
 
-class SupervisorsView(identity.ServiceMixin, APIView):
+class MemberSearchView(identity.ServiceMixin, APIView):
+    """Search members of a course by alias and name similarity."""
 
     session_class = IDP3Session
     service_class = GulService
 
+    class Serializer(serializers.Serializer):
+        q = serializers.CharField()
+        limit = serializers.IntegerField(required=False, default=10,
+                                         min_value=1, max_value=100)
+
     def get(self, request, course_id):
-        return Response(
-            self.service.members(course_id,
-                                 GulService.MEMBER_TYPE_SUPERVISOR))
+        serializer = self.Serializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+
+        # Course ids are ints in the bot, and cached service results and
+        # indexes are shared with it
+        course_id = int(course_id)
+
+        term = serializer.validated_data['q'].lower()
+        limit = serializer.validated_data['limit']
+
+        index = MemberIndex.get((self.service.identity, course_id),
+                                self.service.roster(course_id))
 
+        member = index.by_alias(term)
+        if member:
+            return Response([dict(member, score=1.0)])
 
-class AssignmentsView(identity.ServiceMixin, APIView):
+        return Response([
+            dict(member, score=score)
+            for score, member in index.search(term, limit)
+        ])
+
+
+class AssignmentsView(identity.SnapshotMixin, APIView):
 
     session_class = IDP3Session
     service_class = GulService
+    snapshot_class = AssignmentSnapshot
 
     def get(self, request, course_id):
-        return Response(self.service.assignments(course_id))
+        course_id = int(course_id)
+
+        data = self.snapshot(course_id)
+        if data is None:
+            data = self.service.assignments(course_id)
+
+        return Response(data)
@@ -6,12 +6,28 @@ from rest_framework import serializers, status
 from rest_framework.views import APIView
 from rest_framework.response import Response
 
+from utils import concurrency
 from utils.token import generate_token
 from utils.models import get_or_none
+from utils.cache import Cache
 from gul.data.session import Credentials, Session, CAS3Session, IDP3Session
+from gul.data import services
 from gul.models import Identity, Authorization
 
 
+# Identities, sessions and services ready for use, keyed by token. The cache
+# is local to the process, so logouts and keepalive writes in other processes
+# are only seen once the entries expire.
+hydrated = Cache(size=1000)
+
+# Seconds until an identity is read again from the database, i.e. how long a
+# token revoked by another process stays usable
+IDENTITY_TTL = 30
+
+# Seconds until sessions and services are built again from stored rows
+SERVICE_TTL = 2 * 60
+
+
 class IdentityMixin(object):
 
     SESSION_CLASS = [
@@ -19,6 +35,40 @@ class IdentityMixin(object):
         IDP3Session,
     ]
 
+    # Session classes used to authorize services
+    SERVICE_CLASS = [
+        (IDP3Session, services.GulService),
+        (CAS3Session, services.LadokService),
+    ]
+
+    @classmethod
+    def invalidate(cls, token):
+        """Remove hydrated objects for the specified token."""
+        if token:
+            hydrated.invalidate(token)
+
+    @classmethod
+    def authorize(cls, identity, session_class, service_class):
+        """Login to service with the session of the specified identity and
+        store the authorization. Returns the service and whether the login
+        succeeded."""
+
+        service = service_class(identity=identity.alias)
+        session = session_class.from_data(identity.session)
+        success = service.login(session)
+
+        if success:
+            Authorization(
+                identity=identity,
+                service=service_class.NAME,
+                session=service.session.to_data(),
+            ).upsert(update=('session',))
+
+            hydrated.set((identity.token, 'service', service_class.NAME),
+                         service, ttl=SERVICE_TTL)
+
+        return service, success
+
 
 class LoginView(IdentityMixin, APIView):
     """Login to GU."""
@@ -27,6 +77,7 @@ class LoginView(IdentityMixin, APIView):
 
         username = serializers.CharField()
         password = serializers.CharField()
+        preauthorize = serializers.BooleanField(required=False)
 
     serializer_class = Serializer
 
@@ -42,34 +93,36 @@ class LoginView(IdentityMixin, APIView):
                 password=password,
             )
 
-            sessions = []
-            success = True
-
-            for session_class in self.SESSION_CLASS:
-
-                session = session_class()
-                success = success and session.login(credentials)
+            sessions = [session_class()
+                        for session_class in self.SESSION_CLASS]
 
-                if success:
-                    sessions.append(session)
+            success = all(concurrency.map(
+                lambda session: session.login(credentials),
+                sessions,
+                workers=len(sessions),
+            ))
 
             token = None
 
             if success:
                 token = generate_token()
 
-                kwargs = {
-                    'alias': username,
-                }
+                self.invalidate(Identity.objects.filter(
+                    alias=username).values_list('token', flat=True).first())
 
-                Identity(**kwargs).insert_if_not_exists()
-                Identity.objects.filter(**kwargs).update(
+                identity = Identity(
+                    alias=username,
                     session=Session.all_to_data(*sessions),
                     token=token,
-                )
+                ).upsert(update=('session', 'token'))
 
                 Authorization.objects.filter(identity__alias=username).delete()
 
+                services.invalidate(username)
+
+                if serializer.data.get('preauthorize'):
+                    concurrency.spawn(self.preauthorize, identity)
+
             return Response({
                 'success': success,
                 'token': token,
@@ -79,6 +132,16 @@ class LoginView(IdentityMixin, APIView):
             return Response(serializer.errors,
                             status=status.HTTP_400_BAD_REQUEST)
 
+    @classmethod
+    def preauthorize(cls, identity):
+        """Authorize services concurrently."""
+
+        concurrency.map(
+            lambda classes: cls.authorize(identity, *classes),
+            cls.SERVICE_CLASS,
+            workers=len(cls.SERVICE_CLASS),
+        )
+
 
 class LogoutView(IdentityMixin, APIView):
     """Logout from GU."""
@@ -100,6 +163,9 @@ class LogoutView(IdentityMixin, APIView):
 
                 identity.delete()
 
+                services.invalidate(identity.alias)
+                self.invalidate(token)
+
         except ValueError:
             # Invalid token
             success = False
@@ -126,8 +192,8 @@ class SessionMixin(IdentityMixin):
         try:
             # Valid token
             (token,) = re.findall('Token ([a-f0-9]+)', authorization)
-            identity = get_or_none(Identity, token=token) if token else None
-            session = (self.session_class.from_data(identity.session)
+            identity = self.get_identity(token) if token else None
+            session = (self.get_session(identity, self.session_class)
                        if identity else None) if self.session_class else None
 
         except ValueError:
@@ -139,6 +205,34 @@ class SessionMixin(IdentityMixin):
         self.identity = identity
         self.session = session
 
+    @classmethod
+    def get_identity(cls, token):
+        """Get identity with the specified token."""
+
+        key = (token,)
+
+        identity = hydrated.get(key)
+        if identity is None:
+            identity = get_or_none(Identity, token=token)
+
+            if identity:
+                hydrated.set(key, identity, ttl=IDENTITY_TTL)
+
+        return identity
+
+    @classmethod
+    def get_session(cls, identity, session_class):
+        """Get session of the specified identity."""
+
+        key = (identity.token, 'session', session_class.KEY)
+
+        session = hydrated.get(key)
+        if session is None:
+            session = session_class.from_data(identity.session)
+            hydrated.set(key, session, ttl=SERVICE_TTL)
+
+        return session
+
 
 class ServiceMixin(SessionMixin):
     """Mixin for views that require access to a specific GU service."""
@@ -149,27 +243,25 @@ class ServiceMixin(SessionMixin):
         if not self.session:
             raise PermissionDenied()
 
+        key = (self.identity.token, 'service', service_class.NAME)
+
+        service = hydrated.get(key)
+        if service is not None:
+            return service
+
         authorization = get_or_none(Authorization,
                                     identity=self.identity,
                                     service=service_class.NAME)
         if authorization:
             session = session_class.from_data(authorization.session)
-            service = service_class(session=session)
-        else:
-            service = service_class()
-            session = session_class.from_data(self.identity.session)
-            success = service.login(session)
+            service = service_class(session=session,
+                                    identity=self.identity.alias)
 
-            if success:
-                kwargs = {
-                    'identity': self.identity,
-                    'service': service_class.NAME,
-                }
-
-                Authorization(**kwargs).insert_if_not_exists()
-                Authorization.objects.filter(**kwargs).update(
-                    session=service.session.to_data(),
-                )
+            hydrated.set(key, service, ttl=SERVICE_TTL)
+        else:
+            service, success = cls.authorize(self.identity,
+                                             session_class,
+                                             service_class)
 
         return service
 
@@ -188,3 +280,30 @@ class ServiceMixin(SessionMixin):
             raise PermissionDenied()
 
         self.service = service
+
+
+class SnapshotMixin(ServiceMixin):
+    """Mixin for views that can read from a persisted snapshot.
+
+    With the `snapshot` query parameter data is read from a snapshot of
+    `snapshot_class`, its age bounded by the `fresh` and `stale` query
+    parameters in seconds.
+    """
+
+    snapshot_class = NotImplemented
+
+    class SnapshotSerializer(serializers.Serializer):
+        fresh = serializers.IntegerField(required=False, min_value=0)
+        stale = serializers.IntegerField(required=False, min_value=0)
+
+    def snapshot(self, *args):
+        """Get data from the snapshot if requested, otherwise None."""
+
+        if 'snapshot' not in self.request.query_params:
+            return None
+
+        serializer = self.SnapshotSerializer(data=self.request.query_params)
+        serializer.is_valid(raise_exception=True)
+
+        return self.snapshot_class(self.identity, self.service, *args).get(
+            **serializer.validated_data)
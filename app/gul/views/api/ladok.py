@@ -3,13 +3,19 @@ from rest_framework.response import Response
 
 from gul.data.session import CAS3Session
 from gul.data.services import LadokService
+from gul.data.snapshots import GradeSnapshot
 from gul.views.api import identity
 
 
-class CoursesView(identity.ServiceMixin, APIView):
+class CoursesView(identity.SnapshotMixin, APIView):
 
     session_class = CAS3Session
     service_class = LadokService
+    snapshot_class = GradeSnapshot
 
     def get(self, request):
-        return Response(self.service.courses())
+        data = self.snapshot()
+        if data is None:
+            data = self.service.courses()
+
+        return Response(data)
@@ -0,0 +1,89 @@
+import time
+import threading
+import collections
+
+
+class Cache(object):
+    """Size-bounded in-process cache with per-entry expiry.
+
+    Keys are tuples so that related entries can be invalidated together by
+    a common key prefix. The least recently used entry is evicted when the
+    cache is full.
+    """
+
+    MISSING = object()
+
+    def __init__(self, size=1000, ttl=None):
+        self.size = size
+        self.ttl = ttl
+
+        self.entries = collections.OrderedDict()
+        self.lock = threading.RLock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        """Get the value of an entry that has not expired."""
+
+        with self.lock:
+            try:
+                expires, value = self.entries[key]
+            except KeyError:
+                self.misses += 1
+                return default
+
+            if expires is not None and expires <= time.monotonic():
+                del self.entries[key]
+                self.misses += 1
+                return default
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+
+            return value
+
+    def set(self, key, value, ttl=None):
+        """Set the value of an entry, expiring after `ttl` seconds."""
+
+        ttl = self.ttl if ttl is None else ttl
+        expires = time.monotonic() + ttl if ttl is not None else None
+
+        with self.lock:
+            self.entries[key] = (expires, value)
+            self.entries.move_to_end(key)
+
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        """Remove an entry."""
+
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def invalidate(self, *prefix):
+        """Remove all entries with keys starting with the specified prefix."""
+
+        with self.lock:
+            for key in list(self.entries):
+                if key[:len(prefix)] == prefix:
+                    del self.entries[key]
+
+    def clear(self):
+        """Remove all entries and reset counters."""
+
+        with self.lock:
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """Get hit and miss counters."""
+
+        with self.lock:
+            return {
+                'size': len(self.entries),
+                'hits': self.hits,
+                'misses': self.misses,
+            }
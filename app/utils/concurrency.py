@@ -0,0 +1,99 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.db import connections
+
+
+def closing(function):
+    """Wrap function to close database connections opened by the thread."""
+
+    def wrapper(*args, **kwargs):
+        try:
+            return function(*args, **kwargs)
+        finally:
+            connections.close_all()
+
+    return wrapper
+
+
+def map(function, iterable, workers=4):
+    """Apply function to each item using a bounded thread pool.
+
+    Results are returned in the order of the items.
+    """
+
+    items = list(iterable)
+
+    if workers <= 1 or len(items) <= 1:
+        return [function(item) for item in items]
+
+    with ThreadPoolExecutor(max_workers=min(workers, len(items))) as executor:
+        return list(executor.map(closing(function), items))
+
+
+def imap(function, iterable, workers=4):
+    """Apply function to each item using a bounded thread pool.
+
+    Results are yielded as soon as they are available. Items that have not
+    started yet are cancelled when the iteration is stopped early.
+    """
+
+    items = list(iterable)
+
+    if workers <= 1 or len(items) <= 1:
+        for item in items:
+            yield function(item)
+        return
+
+    executor = ThreadPoolExecutor(max_workers=min(workers, len(items)))
+    futures = [executor.submit(closing(function), item) for item in items]
+
+    try:
+        for future in as_completed(futures):
+            yield future.result()
+    finally:
+        for future in futures:
+            future.cancel()
+
+        executor.shutdown(wait=False)
+
+
+def spawn(function, *args, **kwargs):
+    """Run function in a background thread.
+
+    Database connections opened by the thread are closed when it finishes.
+    """
+
+    thread = threading.Thread(target=closing(function),
+                              args=args, kwargs=kwargs, daemon=True)
+    thread.start()
+
+    return thread
+
+
+# Keys of functions running in the background through spawn_once
+running = set()
+running_lock = threading.Lock()
+
+
+def spawn_once(key, function, *args, **kwargs):
+    """Run function in a background thread, unless a function spawned with
+    the same key is still running.
+
+    Returns the thread, or None if nothing was started.
+    """
+
+    with running_lock:
+        if key in running:
+            return None
+
+        running.add(key)
+
+    def run():
+        try:
+            function(*args, **kwargs)
+        finally:
+            with running_lock:
+                running.discard(key)
+
+    return spawn(run)
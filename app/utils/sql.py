@@ -1,6 +1,7 @@
-import collections
+import json
+import collections.abc
 
-from django.db import models, connection as django_connection
+from django.db import models, transaction, connection as django_connection
 from django.utils import timezone
 
 
@@ -88,8 +89,8 @@ class IINE(object):
         self.table = table
         self.primary = primary
 
-        assert isinstance(cl_value, collections.Iterable)
-        assert isinstance(cl_match, collections.Iterable)
+        assert isinstance(cl_value, collections.abc.Iterable)
+        assert isinstance(cl_match, collections.abc.Iterable)
 
         self.cl_value = cl_value
         self.cl_match = cl_match
@@ -164,8 +165,264 @@ class ModelIINE(IINE):
                          cl_match=mcl_match.columns())
 
 
+class Upsert(IINE):
+    """Insert-or-update specification using `ON CONFLICT`."""
+
+    def __init__(self, table, primary, cl_value=None, cl_match=None,
+                 cl_update=None, cl_return=None):
+        """
+        Initialize with
+        * Table name and primary key column name
+        * value: Columns for `VALUES` clause and their types
+        * match: Columns of the unique constraint for `ON CONFLICT` clause
+        * update: Columns updated in conflicting rows, nothing if empty
+        * return: Columns for `RETURNING` clause
+        """
+        super().__init__(table, primary, cl_value=cl_value, cl_match=cl_match)
+
+        self.cl_update = cl_update or []
+        self.cl_return = cl_return or []
+
+    def build(self, size=1):
+        """Build query."""
+        return (
+            'INSERT INTO "{table}" ({cl_value}) '
+            'VALUES {cl_format} '
+            'ON CONFLICT ({cl_conflict}) {action}'
+            '{returning}'
+        ).format(
+            table=self.table,
+
+            cl_value=self.build_cl_value(),
+            cl_format=self.build_cl_format(size=size),
+            cl_conflict=self.build_cl_conflict(),
+
+            action=self.build_action(),
+            returning=self.build_returning(),
+        )
+
+    def build_cl_conflict(self):
+        """Build column list for `ON CONFLICT` clause."""
+        return ', '.join([
+            '"{}"'.format(column)
+            for column, type in self.cl_match
+        ])
+
+    def build_action(self):
+        """Build action for conflicting rows."""
+        if not self.cl_update:
+            return 'DO NOTHING'
+
+        return 'DO UPDATE SET {}'.format(', '.join([
+            '"{column}" = EXCLUDED."{column}"'.format(column=column)
+            for column, type in self.cl_update
+        ]))
+
+    def build_returning(self):
+        """Build `RETURNING` clause."""
+        if not self.cl_return:
+            return ''
+
+        return ' RETURNING {}'.format(', '.join([
+            '"{}"."{}"'.format(self.table, column)
+            for column, type in self.cl_return
+        ]))
+
+
+class ModelUpsert(Upsert):
+    """Insert-or-update specification based on a model."""
+
+    def __init__(self, model, mcl_value=None, mcl_match=None,
+                 mcl_update=None, mcl_return=None):
+        assert isinstance(mcl_value, MCL)
+        assert isinstance(mcl_match, MCL)
+        assert isinstance(mcl_update, MCL)
+        assert isinstance(mcl_return, MCL)
+
+        self.mcl_value = mcl_value
+        self.mcl_match = mcl_match
+        self.mcl_update = mcl_update
+        self.mcl_return = mcl_return
+
+        super().__init__(get_table(model), get_primary_column(model),
+                         cl_value=mcl_value.columns(),
+                         cl_match=mcl_match.columns(),
+                         cl_update=mcl_update.columns(),
+                         cl_return=mcl_return.columns())
+
+
+class CopyFile(object):
+    """Readable file of rows in `COPY` text format, formatted as it is
+    read."""
+
+    ESCAPES = [
+        ('\\', '\\\\'),
+        ('\n', '\\n'),
+        ('\r', '\\r'),
+        ('\t', '\\t'),
+    ]
+
+    def __init__(self, rows):
+        self.lines = (self.format_row(row) for row in rows)
+        self.buffer = ''
+
+    def format_row(self, row):
+        return '\t'.join([self.format_value(value) for value in row]) + '\n'
+
+    def format_value(self, value):
+        if value is None:
+            return '\\N'
+
+        if isinstance(value, bool):
+            value = 't' if value else 'f'
+        elif hasattr(value, 'isoformat'):
+            value = value.isoformat()
+        elif hasattr(value, 'adapted'):
+            value = json.dumps(value.adapted)
+        else:
+            value = str(value)
+
+        for character, escape in self.ESCAPES:
+            value = value.replace(character, escape)
+
+        return value
+
+    def read(self, size=-1):
+        chunks = [self.buffer]
+        length = len(self.buffer)
+
+        while size < 0 or length < size:
+            line = next(self.lines, None)
+            if line is None:
+                break
+
+            chunks.append(line)
+            length += len(line)
+
+        data = ''.join(chunks)
+
+        if size < 0:
+            self.buffer = ''
+            return data
+
+        self.buffer = data[size:]
+        return data[:size]
+
+
+class Copy(Upsert):
+    """Bulk load specification using `COPY FROM STDIN` into a temporary
+    staging table, merged into the table with insert-if-not-exists or
+    insert-or-update semantics."""
+
+    # Column keeping the order of staged rows
+    ROW = '__row'
+
+    def build_staging(self):
+        """Build name of staging table."""
+        return '{}_copy'.format(self.table)
+
+    def build_create(self):
+        """Build query creating the staging table."""
+        return (
+            'CREATE TEMPORARY TABLE "{staging}" '
+            '("{row}" bigserial, {cl_columns}) ON COMMIT DROP'
+        ).format(
+            staging=self.build_staging(),
+            row=self.ROW,
+            cl_columns=', '.join([
+                '"{}" {}'.format(column, type)
+                for column, type in self.cl_value
+            ]),
+        )
+
+    def build_copy(self):
+        """Build query copying rows into the staging table."""
+        return 'COPY "{staging}" ({cl_value}) FROM STDIN'.format(
+            staging=self.build_staging(),
+            cl_value=self.build_cl_value(),
+        )
+
+    def build_drop(self):
+        """Build query dropping the staging table."""
+        return 'DROP TABLE "{}"'.format(self.build_staging())
+
+    def build_values(self):
+        """Build query selecting the last staged row of each match."""
+        return (
+            'SELECT DISTINCT ON ({cl_conflict}) {cl_value} '
+            'FROM "{staging}" '
+            'ORDER BY {cl_conflict}, "{row}" DESC'
+        ).format(
+            staging=self.build_staging(),
+            row=self.ROW,
+            cl_value=self.build_cl_value(),
+            cl_conflict=self.build_cl_conflict(),
+        )
+
+    def build_insert_if_not_exists(self):
+        """Build query inserting staged rows that don't exist."""
+        return (
+            'INSERT INTO "{table}" ({cl_value}) '
+            'SELECT {cl_value_at_values} '
+            'FROM ({values}) AS "values" '
+            'LEFT JOIN "{table}" ON {cl_match} '
+            'WHERE "{table}"."{primary}" IS NULL'
+        ).format(
+            table=self.table,
+            primary=self.primary,
+
+            values=self.build_values(),
+
+            cl_value=self.build_cl_value(),
+            cl_value_at_values=self.build_cl_value_at(table='values'),
+            cl_match=self.build_cl_match(),
+        )
+
+    def build_upsert(self):
+        """Build query inserting staged rows or updating existing rows."""
+        return (
+            'INSERT INTO "{table}" ({cl_value}) '
+            'SELECT {cl_value} FROM ({values}) AS "values" WHERE true '
+            'ON CONFLICT ({cl_conflict}) {action}'
+        ).format(
+            table=self.table,
+
+            values=self.build_values(),
+
+            cl_value=self.build_cl_value(),
+            cl_conflict=self.build_cl_conflict(),
+            action=self.build_action(),
+        )
+
+
+class ModelCopy(Copy):
+    """Bulk load specification based on a model."""
+
+    def __init__(self, model, mcl_value=None, mcl_match=None,
+                 mcl_update=None):
+        assert isinstance(mcl_value, MCL)
+        assert isinstance(mcl_match, MCL)
+        assert isinstance(mcl_update, MCL)
+
+        self.mcl_value = mcl_value
+        self.mcl_match = mcl_match
+        self.mcl_update = mcl_update
+
+        super().__init__(get_table(model), get_primary_column(model),
+                         cl_value=mcl_value.columns(),
+                         cl_match=mcl_match.columns(),
+                         cl_update=mcl_update.columns())
+
+
 class StandardIINEModelMixin(object):
 
+    # Maximum number of instances inserted by one statement, a power of two
+    IINE_CHUNK = 128
+
+    # Compiled statements by model, connection vendor and size
+    iine_statements = {}
+    upsert_statements = {}
+
     @classmethod
     def get_iine_default_connection(cls):
         return django_connection
@@ -184,29 +441,188 @@ class StandardIINEModelMixin(object):
     def get_iine_value_kwargs(cls):
         return {'exclude': ('id',)}
 
-    def insert_if_not_exists(self, connection=None):
-        """Insert this instance if it doesn't exist."""
-        return self.insert_if_not_exist([self], connection=None)
+    @classmethod
+    def get_iine(cls, connection):
+        """Get insert-if-not-exists specification."""
+        return ModelIINE(
+            cls,
+            mcl_value=MCL(cls, connection=connection,
+                          **cls.get_iine_value_kwargs()),
+            mcl_match=MCL(cls, connection=connection,
+                          **cls.get_iine_match_kwargs()),
+        )
 
     @classmethod
-    def insert_if_not_exist(cls, instances, connection=None):
-        """Insert instances that don't exist."""
-        connection = connection or cls.get_iine_default_connection()
+    def get_iine_statement(cls, connection, size):
+        """Get tuple of query and value column list for the specified number
+        of instances, compiled once per connection vendor."""
+
+        key = (cls, connection.vendor, size)
+
+        statement = cls.iine_statements.get(key)
+        if statement is None:
+            iine = cls.get_iine(connection)
+            statement = (iine.build(size=size), iine.mcl_value)
+            cls.iine_statements[key] = statement
+
+        return statement
+
+    @classmethod
+    def get_iine_chunks(cls, instances):
+        """Split instances into chunks of `IINE_CHUNK` instances, and the
+        remainder into chunks with power of two sizes, so that a few
+        statements cover any number of instances."""
 
-        iine = ModelIINE(
+        position = 0
+
+        while position < len(instances):
+            remaining = len(instances) - position
+            size = min(cls.IINE_CHUNK, 1 << (remaining.bit_length() - 1))
+
+            yield instances[position:position + size]
+            position += size
+
+    @classmethod
+    def get_iine_queries(cls, instances, connection):
+        """Get tuples of query and values inserting the instances."""
+
+        for chunk in cls.get_iine_chunks(list(instances)):
+            query, mcl_value = cls.get_iine_statement(connection, len(chunk))
+
+            values = []
+            for instance in chunk:
+                values.extend(mcl_value.values(instance))
+
+            yield query, values
+
+    @classmethod
+    def get_upsert(cls, connection, update=()):
+        """Get insert-or-update specification, updating the fields `update`
+        of existing rows."""
+        return ModelUpsert(
             cls,
             mcl_value=MCL(cls, connection=connection,
                           **cls.get_iine_value_kwargs()),
             mcl_match=MCL(cls, connection=connection,
                           **cls.get_iine_match_kwargs()),
+            mcl_update=MCL(cls, connection=connection, fields=update),
+            mcl_return=MCL(cls, connection=connection),
         )
 
-        query = iine.build(size=len(instances))
+    @classmethod
+    def get_upsert_statement(cls, connection, size, update=()):
+        """Get tuple of query and specification for the specified number of
+        instances, compiled once per connection vendor."""
+
+        key = (cls, connection.vendor, size, tuple(update))
 
-        values = []
+        statement = cls.upsert_statements.get(key)
+        if statement is None:
+            upsert = cls.get_upsert(connection, update=update)
+            statement = (upsert.build(size=size), upsert)
+            cls.upsert_statements[key] = statement
+
+        return statement
+
+    def upsert(self, update=(), connection=None):
+        """Insert this instance, or update the fields `update` of the
+        existing row. Returns the stored row, or None if it already existed
+        and nothing is updated."""
+        rows = self.upsert_all([self], update=update, connection=connection)
+        return rows[0] if rows else None
+
+    @classmethod
+    def upsert_all(cls, instances, update=(), connection=None):
+        """Insert instances, or update the fields `update` of existing rows,
+        with one statement per chunk.
+
+        Rows are matched on the same unique fields as insert-if-not-exists,
+        of instances matching the same row the last one is used. Returns the
+        inserted and updated rows as new instances, rows that already existed
+        are not returned if nothing is updated.
+        """
+        connection = connection or cls.get_iine_default_connection()
+
+        # Specification shared by the statements of every size
+        query, upsert = cls.get_upsert_statement(connection, 1, update)
+
+        unique = collections.OrderedDict()
         for instance in instances:
-            values.extend(iine.mcl_value.values(instance))
+            unique[tuple(upsert.mcl_match.values(instance))] = instance
+
+        rows = []
+
+        # Chunks are written all or none, like a single statement
+        with transaction.atomic(using=connection.alias):
+            with connection.cursor() as cursor:
+                for chunk in cls.get_iine_chunks(list(unique.values())):
+                    query, upsert = cls.get_upsert_statement(
+                        connection, len(chunk), update)
+
+                    values = []
+                    for instance in chunk:
+                        values.extend(upsert.mcl_value.values(instance))
+
+                    cursor.execute(query, values)
+                    rows.extend(cursor.fetchall())
+
+        names = [field.attname for field in upsert.mcl_return.fields]
+
+        return [cls.from_db(connection.alias, names, row) for row in rows]
+
+    @classmethod
+    def get_copy(cls, connection, update=()):
+        """Get bulk load specification, updating the fields `update` of
+        existing rows when merged with insert-or-update semantics."""
+        return ModelCopy(
+            cls,
+            mcl_value=MCL(cls, connection=connection,
+                          **cls.get_iine_value_kwargs()),
+            mcl_match=MCL(cls, connection=connection,
+                          **cls.get_iine_match_kwargs()),
+            mcl_update=MCL(cls, connection=connection, fields=update),
+        )
+
+    @classmethod
+    def bulk_load(cls, instances, update=None, connection=None):
+        """Bulk load instances through a staging table.
+
+        Instances are streamed with `COPY FROM STDIN` and merged in one
+        statement, with insert-if-not-exists semantics if `update` is None,
+        otherwise as `upsert_all`. Of instances matching the same row the
+        last one is used. Returns the number of inserted or updated rows.
+        """
+        connection = connection or cls.get_iine_default_connection()
+
+        copy = cls.get_copy(connection, update=update or ())
+
+        rows = (copy.mcl_value.values(instance) for instance in instances)
+
+        with transaction.atomic(using=connection.alias):
+            with connection.cursor() as cursor:
+                cursor.execute(copy.build_create())
+                cursor.copy_expert(copy.build_copy(), CopyFile(rows))
+
+                cursor.execute(copy.build_insert_if_not_exists()
+                               if update is None else copy.build_upsert())
+                count = cursor.rowcount
+
+                cursor.execute(copy.build_drop())
+
+        return count
+
+    def insert_if_not_exists(self, connection=None):
+        """Insert this instance if it doesn't exist."""
+        return self.insert_if_not_exist([self], connection=connection)
+
+    @classmethod
+    def insert_if_not_exist(cls, instances, connection=None):
+        """Insert instances that don't exist."""
+        connection = connection or cls.get_iine_default_connection()
 
-        cursor = connection.cursor()
-        cursor.execute(query, values)
-        cursor.close()
+        # Chunks are inserted all or none, like a single statement
+        with transaction.atomic(using=connection.alias):
+            with connection.cursor() as cursor:
+                for query, values in cls.get_iine_queries(instances,
+                                                          connection):
+                    cursor.execute(query, values)
@@ -0,0 +1,147 @@
+import datetime
+import unittest
+
+from psycopg2.extras import Json
+
+from utils.sql import IINE, Upsert, Copy, CopyFile, StandardIINEModelMixin
+
+
+TABLE = 'gul_room'
+PRIMARY = 'id'
+
+CL_VALUE = [('course_id', 'integer'), ('course_name', 'varchar(255)')]
+CL_MATCH = [('course_id', 'integer')]
+CL_UPDATE = [('course_name', 'varchar(255)')]
+CL_RETURN = [('id', 'integer')] + CL_VALUE
+
+MATCH = (
+    '(("gul_room"."course_id" = "values"."course_id"::integer) OR '
+    '("gul_room"."course_id" IS NULL AND "values"."course_id" IS NULL))'
+)
+
+
+class IINETestCase(unittest.TestCase):
+
+    def test_build(self):
+        iine = IINE(TABLE, PRIMARY, cl_value=CL_VALUE, cl_match=CL_MATCH)
+
+        self.assertEqual(iine.build(size=2), (
+            'INSERT INTO "gul_room" ("course_id", "course_name") '
+            'SELECT "values"."course_id"::integer, '
+            '"values"."course_name"::varchar(255) '
+            'FROM (VALUES (%s, %s), (%s, %s)) '
+            'AS "values" ("course_id", "course_name") '
+            'LEFT JOIN gul_room ON ' + MATCH + ' '
+            'WHERE "gul_room"."id" IS NULL'
+        ))
+
+    def test_chunks(self):
+
+        class Model(StandardIINEModelMixin):
+            IINE_CHUNK = 4
+
+        sizes = [[len(chunk) for chunk in Model.get_iine_chunks(
+            list(range(count)))] for count in (0, 1, 3, 4, 11)]
+
+        self.assertEqual(sizes, [[], [1], [2, 1], [4], [4, 4, 2, 1]])
+
+
+class UpsertTestCase(unittest.TestCase):
+
+    def test_build_update(self):
+        upsert = Upsert(TABLE, PRIMARY, cl_value=CL_VALUE, cl_match=CL_MATCH,
+                        cl_update=CL_UPDATE, cl_return=CL_RETURN)
+
+        self.assertEqual(upsert.build(size=2), (
+            'INSERT INTO "gul_room" ("course_id", "course_name") '
+            'VALUES (%s, %s), (%s, %s) '
+            'ON CONFLICT ("course_id") '
+            'DO UPDATE SET "course_name" = EXCLUDED."course_name" '
+            'RETURNING "gul_room"."id", "gul_room"."course_id", '
+            '"gul_room"."course_name"'
+        ))
+
+    def test_build_nothing(self):
+        upsert = Upsert(TABLE, PRIMARY, cl_value=CL_VALUE, cl_match=CL_MATCH)
+
+        self.assertEqual(upsert.build(), (
+            'INSERT INTO "gul_room" ("course_id", "course_name") '
+            'VALUES (%s, %s) '
+            'ON CONFLICT ("course_id") DO NOTHING'
+        ))
+
+
+class CopyTestCase(unittest.TestCase):
+
+    VALUES = (
+        'SELECT DISTINCT ON ("course_id") "course_id", "course_name" '
+        'FROM "gul_room_copy" ORDER BY "course_id", "__row" DESC'
+    )
+
+    def setUp(self):
+        self.copy = Copy(TABLE, PRIMARY, cl_value=CL_VALUE, cl_match=CL_MATCH,
+                         cl_update=CL_UPDATE)
+
+    def test_build_staging(self):
+        self.assertEqual(self.copy.build_create(), (
+            'CREATE TEMPORARY TABLE "gul_room_copy" '
+            '("__row" bigserial, "course_id" integer, '
+            '"course_name" varchar(255)) ON COMMIT DROP'
+        ))
+        self.assertEqual(self.copy.build_copy(), (
+            'COPY "gul_room_copy" ("course_id", "course_name") FROM STDIN'
+        ))
+        self.assertEqual(self.copy.build_drop(), 'DROP TABLE "gul_room_copy"')
+
+    def test_build_values(self):
+        self.assertEqual(self.copy.build_values(), self.VALUES)
+
+    def test_build_insert_if_not_exists(self):
+        self.assertEqual(self.copy.build_insert_if_not_exists(), (
+            'INSERT INTO "gul_room" ("course_id", "course_name") '
+            'SELECT "values"."course_id"::integer, '
+            '"values"."course_name"::varchar(255) '
+            'FROM (' + self.VALUES + ') AS "values" '
+            'LEFT JOIN "gul_room" ON ' + MATCH + ' '
+            'WHERE "gul_room"."id" IS NULL'
+        ))
+
+    def test_build_upsert(self):
+        self.assertEqual(self.copy.build_upsert(), (
+            'INSERT INTO "gul_room" ("course_id", "course_name") '
+            'SELECT "course_id", "course_name" '
+            'FROM (' + self.VALUES + ') AS "values" WHERE true '
+            'ON CONFLICT ("course_id") '
+            'DO UPDATE SET "course_name" = EXCLUDED."course_name"'
+        ))
+
+
+class CopyFileTestCase(unittest.TestCase):
+
+    def test_escape(self):
+        rows = [
+            [None, '', 'a\tb', 'a\nb', 'a\rb', 'a\\b', '\\N'],
+            [True, False, 1, 1.5],
+            [datetime.datetime(2016, 9, 1, 12, 30,
+                               tzinfo=datetime.timezone.utc),
+             datetime.date(2016, 9, 1)],
+            [Json({'name': 'a\tb', 'path': 'c:\\d'})],
+        ]
+
+        self.assertEqual(CopyFile(rows).read(), (
+            '\\N\t\ta\\tb\ta\\nb\ta\\rb\ta\\\\b\t\\\\N\n'
+            't\tf\t1\t1.5\n'
+            '2016-09-01T12:30:00+00:00\t2016-09-01\n'
+            '{"name": "a\\\\tb", "path": "c:\\\\\\\\d"}\n'
+        ))
+
+    def test_read_size(self):
+        rows = [['row {}'.format(index), index] for index in range(100)]
+
+        data = CopyFile(rows).read()
+
+        f = CopyFile(rows)
+        chunks = iter(lambda: f.read(7), '')
+
+        self.assertEqual(''.join(chunks), data)
+        self.assertEqual(data.count('\n'), 100)
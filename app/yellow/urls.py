@@ -14,13 +14,19 @@ api_v1 = [
     url(r'courses/$',
         api.gul.CoursesView.as_view(),
         name='courses'),
-    url(r'courses/(?P<course_id>[^/]+)/students/$',
+    url(r'courses/(?P<course_id>[0-9]+)/students/$',
         api.gul.StudentsView.as_view(),
         name='students'),
-    url(r'courses/(?P<course_id>[^/]+)/supervisors/$',
+    url(r'courses/(?P<course_id>[0-9]+)/supervisors/$',
         api.gul.SupervisorsView.as_view(),
         name='supervisors'),
-    url(r'courses/(?P<course_id>[^/]+)/assignments/$',
+    url(r'courses/(?P<course_id>[0-9]+)/members/$',
+        api.gul.RosterView.as_view(),
+        name='members'),
+    url(r'courses/(?P<course_id>[0-9]+)/members/search/$',
+        api.gul.MemberSearchView.as_view(),
+        name='member-search'),
+    url(r'courses/(?P<course_id>[0-9]+)/assignments/$',
         api.gul.AssignmentsView.as_view(),
         name='assignments'),
 
@@ -35,6 +41,8 @@ api_v1 = [
     url(r'chat/', include([
         url(r'handle/', api.chat.HandleView.as_view(), name='handle'),
         url(r'rooms/', api.chat.RoomsView.as_view(), name='rooms'),
+        url(r'jobs/(?P<job_id>[a-f0-9]+)/$', api.chat.JobView.as_view(),
+            name='job'),
     ], namespace='chat')),
 ]
 